@@ -0,0 +1,125 @@
+"""
+Parses many source files with one grammar, in a pool of worker processes.
+
+The grammar's lexer automata and parse tables are built once, in the calling
+process, and sent to each worker serialized with pickle, so the workers do
+not rebuild them.
+
+Usage:
+
+    python batch.py TOKENS GRAMMAR SOURCE... [-j WORKERS] [--ordered]
+        [--compact] [--method slr|lalr] [--cache-dir DIR]
+
+prints one line per source file with its parse tree in pre-order, or the
+name of the exception the parse raised.
+"""
+
+import argparse
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+
+from lexer import InvalidToken
+from parse import Grammar, Parser, NonLRGrammarError, SourceFileSyntaxError
+
+# The exceptions a parse reports as its result instead of raising
+# (UnicodeDecodeError: a source file that is not in the locale's encoding)
+PARSE_ERRORS = (InvalidToken, NonLRGrammarError, SourceFileSyntaxError, OSError, UnicodeDecodeError)
+
+# The grammar of this worker process, set by init_worker
+worker_grammar = None
+
+def init_worker(tables):
+    """ Sets the grammar of a worker process from the pickled Grammar tables. """
+
+    global worker_grammar
+    worker_grammar = pickle.loads(tables)
+
+def parse_file(source_filename, compact=False):
+    """ Parses source_filename with the worker's grammar.
+
+    Returns: tuple
+        (source_filename, tree, error): the parse tree as returned by
+        Parser.parse and None, or None and the exception the parse raised.
+    """
+
+    try:
+        tree = Parser.from_grammar(worker_grammar, source_filename).parse(compact)
+    except PARSE_ERRORS as e:
+        return (source_filename, None, e)
+    return (source_filename, tree, None)
+
+def parse_files(grammar, source_filenames, max_workers=None, ordered=False, compact=False, chunksize=1):
+    """ Parses each of source_filenames with grammar, in a pool of
+    max_workers processes (by default one per CPU).
+
+    Parameters:
+
+    grammar: Grammar
+        The grammar to parse with.  It is pickled once and each worker
+        loads it when it starts.
+
+    ordered: bool
+        If True, results are generated in the order of source_filenames;
+        otherwise each is generated as soon as its parse finishes.
+
+    chunksize: int
+        For ordered results, how many files are sent to a worker at a time.
+
+    Returns: generator
+        Generates a tuple (source_filename, tree, error) per file, as
+        returned by parse_file.
+    """
+
+    tables = pickle.dumps(grammar, pickle.HIGHEST_PROTOCOL)
+    with ProcessPoolExecutor(max_workers, initializer=init_worker, initargs=(tables,)) as executor:
+        if ordered:
+            yield from executor.map(parse_file, source_filenames, repeat(compact), chunksize=chunksize)
+        else:
+            futures = [executor.submit(parse_file, source_filename, compact)
+                       for source_filename in source_filenames]
+            for future in as_completed(futures):
+                yield future.result()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Parse source files with one grammar in parallel.")
+    arg_parser.add_argument("lexer_filename", help="token specification file")
+    arg_parser.add_argument("grammar_filename", help="grammar file")
+    arg_parser.add_argument("source_filenames", nargs="+", help="source files to parse")
+    arg_parser.add_argument("-j", "--workers", type=int, default=None,
+                            help="number of worker processes (default: one per CPU)")
+    arg_parser.add_argument("--ordered", action="store_true",
+                            help="print results in input order instead of completion order")
+    arg_parser.add_argument("--compact", action="store_true", help="leave unit rule nodes out of the trees")
+    arg_parser.add_argument("--method", choices=("slr", "lalr"), default="slr", help="parse table method")
+    arg_parser.add_argument("--cache-dir", default=None, help="directory for cached compiled tables")
+    args = arg_parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        grammar = Grammar(args.lexer_filename, args.grammar_filename, args.cache_dir, args.method)
+    except NonLRGrammarError:
+        print(f"{args.grammar_filename}: NonLRGrammarError", file=sys.stderr)
+        return 2
+    build_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    failed = 0
+    for source_filename, tree, error in parse_files(grammar, args.source_filenames, args.workers,
+                                                    args.ordered, args.compact):
+        if error != None:
+            failed += 1
+            print(f"{source_filename}: {type(error).__name__}")
+        else:
+            print(f"{source_filename}: {' '.join(tree)}")
+    elapsed = time.perf_counter() - start
+
+    count = len(args.source_filenames)
+    print(f"built tables in {build_elapsed:.2f} s, parsed {count} files ({failed} failed) in {elapsed:.2f} s "
+          f"({count / elapsed:.1f} files/s)", file=sys.stderr)
+    return 1 if failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,759 @@
+""" Benchmarks for the lexer and parser.
+
+Each benchmark generates its own token specification, grammar and source
+files in a temporary directory, so it can be run from anywhere:
+
+    python3 bench.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import parse_files
+from lexer import Lex, map_file
+from parse import Grammar, Parser, SourceFileSyntaxError
+from reg import RegEx
+
+# Alphabet used by the generated token specifications.
+LETTERS = "abcdfghijklmnopqrstuvwxyz"
+DIGITS = "0123456789"
+ALPHABET = LETTERS + DIGITS + "+*();="
+
+def alternation(chars):
+    """ Returns a regex matching any single character in chars. """
+
+    return "(" + "|".join(chars) + ")"
+
+def write_token_spec(path, num_keywords=0):
+    """ Writes a small programming-language style token spec to path. """
+
+    letter = alternation(LETTERS)
+    digit = alternation(DIGITS)
+    with open(path, "w") as f:
+        f.write(f'alphabet "{ALPHABET}"\n')
+        if num_keywords > 0:
+            f.write(f'KEYWORD "({"|".join(keywords(num_keywords))})"\n')
+        f.write(f'ID "{letter}({letter}|{digit})*"\n')
+        f.write(f'NUM "{digit}{digit}*"\n')
+        f.write('PLUS "+"\n')
+        f.write('TIMES "\\*"\n')
+        f.write('LPAREN "\\("\n')
+        f.write('RPAREN "\\)"\n')
+        f.write('SEMI ";"\n')
+        f.write('ASSIGN "="\n')
+
+def write_source(path, num_statements, seed=0):
+    """ Writes num_statements random assignment statements to path. """
+
+    rng = random.Random(seed)
+
+    def name():
+        return rng.choice(LETTERS) + "".join(rng.choice(LETTERS + DIGITS) for _ in range(rng.randint(0, 6)))
+
+    def operand():
+        return name() if rng.random() < 0.6 else str(rng.randint(0, 99999))
+
+    with open(path, "w") as f:
+        for _ in range(num_statements):
+            expr = operand()
+            for _ in range(rng.randint(1, 5)):
+                expr += rng.choice([" + ", "*", " * ", "+"]) + operand()
+            if rng.random() < 0.3:
+                expr = "(" + expr + ")"
+            f.write(f"{name()} = {expr};\n")
+
+def write_statement_grammar(path):
+    """ Writes a grammar for the statements produced by write_source to path. """
+
+    with open(path, "w") as f:
+        f.write("ID NUM PLUS TIMES LPAREN RPAREN SEMI ASSIGN\n%%\n")
+        f.write("P : P S\nP : S\nS : ID ASSIGN E SEMI\n")
+        f.write("E : E PLUS T\nE : T\nT : T TIMES F\nT : F\n")
+        f.write("F : LPAREN E RPAREN\nF : ID\nF : NUM\n%%\n")
+
+def write_layered_grammar(path, levels):
+    """ Writes an expression grammar with one nonterminal per precedence level to path. """
+
+    with open(path, "w") as f:
+        f.write("ID NUM LPAREN RPAREN " + " ".join(f"OP{i}" for i in range(levels)) + "\n%%\n")
+        for i in range(levels):
+            f.write(f"E{i} : E{i} OP{i} E{i + 1}\nE{i} : E{i + 1}\n")
+        f.write(f"E{levels} : LPAREN E0 RPAREN\nE{levels} : ID\nE{levels} : NUM\n%%\n")
+
+def write_layered_token_spec(path, levels):
+    """ Writes a token spec for the terminals of write_layered_grammar to path (OPi is "opi"). """
+
+    letter = alternation(LETTERS)
+    digit = alternation(DIGITS)
+    with open(path, "w") as f:
+        f.write(f'alphabet "{ALPHABET}"\n')
+        for i in range(levels):
+            f.write(f'OP{i} "op{i}"\n')
+        f.write(f'ID "{letter}({letter}|{digit})*"\n')
+        f.write(f'NUM "{digit}{digit}*"\n')
+        f.write('LPAREN "\\("\n')
+        f.write('RPAREN "\\)"\n')
+
+def write_layered_source(path, levels, num_operands, seed=0):
+    """ Writes an expression of write_layered_grammar with num_operands operands to path. """
+
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write(rng.choice(["x", "1"]))
+        for i in range(1, num_operands):
+            f.write(f" op{rng.randrange(levels)} " + rng.choice(["x", "1", "( y )"]))
+            if i % 10 == 0:
+                f.write("\n")
+        f.write("\n")
+
+def count_tokens(lex):
+    """ Pulls tokens from lex until EOF, returning how many there were. """
+
+    count = 0
+    try:
+        while True:
+            lex.next_token()
+            count += 1
+    except EOFError:
+        pass
+    return count
+
+def bench_lexer(num_statements=200, combined=True):
+    """ Times Lex construction and tokens/second on a generated source file. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_source(source_file, num_statements)
+
+        start = time.perf_counter()
+        lex = Lex(token_file, source_file, combined=combined)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tokens = count_tokens(lex)
+        scan = time.perf_counter() - start
+
+    mode = "combined" if combined else "per-token"
+    print(f"lexer ({mode}): build {build * 1000:.1f} ms, {tokens} tokens in {scan:.3f} s "
+          f"({tokens / scan:,.0f} tokens/s)")
+
+def recompiling_tokens(lex, text):
+    """ The tokens of text, found the way the lexer did before it compiled
+    each token regex once: every candidate prefix of every word is tested
+    against each token regex in turn with RegEx.simulate, which builds the
+    regex's NFA and DFA again on every call.
+    """
+
+    tokens = []
+    for word in text.split():
+        start = 0
+        while start < len(word):
+            match = None
+            for end in range(start + 1, len(word) + 1):
+                for token_type, (_, reg) in lex.regex_dic.items():
+                    if reg.simulate(word[start:end]):
+                        match = (token_type, end)
+                        break
+            if match == None:
+                tokens.append("INVALID")
+                start = len(word)
+            else:
+                tokens.append((match[0], word[start:match[1]]))
+                start = match[1]
+    return tokens
+
+def bench_lexer_compile_once(num_statements=5):
+    """ Compares tokens/second of Lex, which compiles each token regex once,
+    with recompiling the regexes for every candidate token (before user-001).
+    """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_source(source_file, num_statements)
+        with open(source_file) as f:
+            text = f.read()
+        lex = Lex(token_file, None, combined=False)
+
+        start = time.perf_counter()
+        before = recompiling_tokens(lex, text)
+        before_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        after = list(lex.for_source(text=text).tokens())
+        after_elapsed = time.perf_counter() - start
+
+    assert before == after
+    print(f"lexer regexes ({num_statements} statements, {len(after)} tokens): recompiled per candidate "
+          f"{len(before) / before_elapsed:,.1f} tokens/s, compiled once {len(after) / after_elapsed:,.0f} tokens/s")
+
+def bench_lexer_streaming(num_statements=50000):
+    """ Reports time to the first token and peak traced memory while lexing a large file. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_source(source_file, num_statements)
+        size = os.path.getsize(source_file)
+        lex = Lex(token_file, source_file)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        lex.next_token()
+        first = time.perf_counter() - start
+        tokens = 1 + count_tokens(lex)
+        total = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f"lexer streaming ({size / 1e6:.1f} MB, {tokens} tokens): first token {first * 1000:.1f} ms, "
+          f"all tokens {total:.2f} s, peak memory {peak / 1e6:.1f} MB")
+
+def bench_lexer_buffer(num_statements=20000):
+    """ Compares lexing a large file as text, as a memory-mapped buffer, and as spans only.
+
+    Each way is timed, then run again under tracemalloc for its peak memory
+    (tracing slows allocation-heavy code down unevenly).
+    """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_source(source_file, num_statements)
+        lex = Lex(token_file, None)
+
+        def scan(label):
+            if label == "text":
+                return count_tokens(lex.for_source(source_file))
+            if label == "mmap":
+                return count_tokens(lex.for_buffer(map_file(source_file)))
+            return sum(1 for _ in lex.for_buffer(map_file(source_file)).spans())
+
+        results = []
+        for label in ("text", "mmap", "mmap spans"):
+            start = time.perf_counter()
+            tokens = scan(label)
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            scan(label)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append(f"{label} {tokens / elapsed:,.0f} tokens/s ({peak / 1e3:.0f} KB peak)")
+
+    print(f"lexer sources ({num_statements} statements): " + ", ".join(results))
+
+def bench_lexer_cache(num_keywords=50):
+    """ Times Lex construction without a cache, with an empty cache, and with a warm cache. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        cache_dir = os.path.join(tmp, "cache")
+        write_token_spec(token_file, num_keywords)
+        write_source(source_file, 1)
+
+        for label, kwargs in [("no cache", {}), ("cold", {"cache_dir": cache_dir}),
+                              ("warm", {"cache_dir": cache_dir})]:
+            start = time.perf_counter()
+            Lex(token_file, source_file, **kwargs)
+            elapsed = time.perf_counter() - start
+            print(f"Lex startup ({num_keywords} keywords, {label}): {elapsed * 1000:.1f} ms")
+
+def bench_parser_cache(levels=30):
+    """ Times Parser construction without a cache, with an empty cache, and with a warm cache. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        cache_dir = os.path.join(tmp, "cache")
+        write_token_spec(token_file)
+        write_layered_grammar(grammar_file, levels)
+        write_source(source_file, 1)
+
+        for label, kwargs in [("no cache", {}), ("cold", {"cache_dir": cache_dir}),
+                              ("warm", {"cache_dir": cache_dir})]:
+            start = time.perf_counter()
+            parser = Parser(token_file, grammar_file, source_file, **kwargs)
+            elapsed = time.perf_counter() - start
+            print(f"Parser startup ({levels} levels, {len(parser.states)} states, {label}): "
+                  f"{elapsed * 1000:.1f} ms")
+
+def bench_parse_many(num_inputs=200):
+    """ Compares building a Parser per input with parsing every input against one Grammar. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        write_token_spec(token_file)
+        write_statement_grammar(grammar_file)
+
+        sources = []
+        for i in range(num_inputs):
+            sources.append(os.path.join(tmp, f"src{i}.txt"))
+            write_source(sources[-1], 5, seed=i)
+
+        start = time.perf_counter()
+        for source_file in sources:
+            Parser(token_file, grammar_file, source_file).parse()
+        per_input = time.perf_counter() - start
+
+        start = time.perf_counter()
+        grammar = Grammar(token_file, grammar_file)
+        for source_file in sources:
+            grammar.parse(source_file)
+        shared = time.perf_counter() - start
+
+    print(f"{num_inputs} inputs: Parser per input {per_input:.3f} s, "
+          f"one Grammar {shared:.3f} s ({num_inputs / shared:,.0f} inputs/s)")
+
+def bench_batch(num_inputs=400, max_workers=None):
+    """ Reports files/second for batch.parse_files with 1 up to max_workers
+    processes (by default one per CPU), against a Parser per file.
+    """
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        write_token_spec(token_file)
+        write_statement_grammar(grammar_file)
+
+        sources = []
+        for i in range(num_inputs):
+            sources.append(os.path.join(tmp, f"src{i}.txt"))
+            write_source(sources[-1], 50, seed=i)
+
+        start = time.perf_counter()
+        for source_file in sources:
+            Parser(token_file, grammar_file, source_file).parse()
+        results = [f"Parser per file {num_inputs / (time.perf_counter() - start):,.0f}"]
+
+        grammar = Grammar(token_file, grammar_file)
+        workers = 1
+        while True:
+            start = time.perf_counter()
+            for _ in parse_files(grammar, sources, workers, ordered=True, chunksize=8):
+                pass
+            results.append(f"{workers} workers {num_inputs / (time.perf_counter() - start):,.0f}")
+            if workers == max_workers:
+                break
+            workers = min(workers * 2, max_workers)
+
+    print(f"batch parse of {num_inputs} files, files/s: " + ", ".join(results))
+
+def bench_threads(num_inputs=200, num_threads=8):
+    """ Parses inputs from num_threads threads sharing one Grammar (and one
+    lexer without a combined scanner), and checks every result is identical
+    to parsing the same input alone.
+    """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        write_token_spec(token_file)
+        write_statement_grammar(grammar_file)
+
+        sources = []
+        for i in range(num_inputs):
+            sources.append(os.path.join(tmp, f"src{i}.txt"))
+            write_source(sources[-1], 20, seed=i)
+        with open(sources[3], "a") as f:
+            f.write("x = ;\n")
+        grammar = Grammar(token_file, grammar_file)
+        lex = Lex(token_file, None, combined=False)
+        buffers = []
+        for source_file in sources:
+            with open(source_file, "rb") as f:
+                buffers.append(f.read())
+
+        def run(i):
+            # each input in several ways, so parses of all kinds overlap
+            try:
+                tree = grammar.parse(sources[i])
+            except SourceFileSyntaxError:
+                tree = "SourceFileSyntaxError"
+            if i % 4 == 0:
+                return (tree, list(Parser.from_grammar(grammar, buffer=buffers[i]).parse_array().preorder()))
+            if i % 4 == 1:
+                return (tree, grammar.parse(buffer=buffers[i], compact=True))
+            return (tree, count_tokens(lex.for_source(sources[i])))
+
+        expected = [run(i) for i in range(num_inputs)]
+        lex = Lex(token_file, None, combined=False)
+
+        # switching threads often makes them interleave inside the parse loop
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(num_threads) as executor:
+                results = list(executor.map(run, [i for _ in range(5) for i in range(num_inputs)]))
+            elapsed = time.perf_counter() - start
+        finally:
+            sys.setswitchinterval(interval)
+
+    mismatches = sum(1 for j, result in enumerate(results) if result != expected[j % num_inputs])
+    print(f"threads ({num_threads} threads, {len(results)} parses): {mismatches} results differ "
+          f"from single-threaded, {elapsed:.2f} s")
+    if mismatches > 0:
+        raise AssertionError(f"{mismatches} concurrent parses differ")
+
+def bench_parse(num_statements=400, repeat=5):
+    """ Times parsing a generated file against lexing it alone, best of repeat runs. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_statement_grammar(grammar_file)
+        write_source(source_file, num_statements)
+        grammar = Grammar(token_file, grammar_file)
+
+        lex_time = parse_time = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tokens = count_tokens(grammar.lexer.for_source(source_file))
+            lex_time = min(lex_time, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            grammar.parse(source_file)
+            parse_time = min(parse_time, time.perf_counter() - start)
+
+    print(f"parse: {tokens} tokens in {parse_time * 1000:.1f} ms (lexing alone {lex_time * 1000:.1f} ms), "
+          f"driver {(parse_time - lex_time) * 1e9 / tokens:.0f} ns/token")
+
+def bench_unit_reductions(num_statements=400, levels=20, repeat=5):
+    """ Reports stack reductions per token and parse time with and without unit rule bypassing. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = []
+        for name in ("statements", f"{levels} levels"):
+            cases.append((name, os.path.join(tmp, f"{name}-tokens.txt"), os.path.join(tmp, f"{name}-grammar.txt"),
+                          os.path.join(tmp, f"{name}-src.txt")))
+        write_token_spec(cases[0][1])
+        write_statement_grammar(cases[0][2])
+        write_source(cases[0][3], num_statements)
+        write_layered_token_spec(cases[1][1], levels)
+        write_layered_grammar(cases[1][2], levels)
+        write_layered_source(cases[1][3], levels, num_statements)
+
+        for name, token_file, grammar_file, source_file in cases:
+            tokens = count_tokens(Lex(token_file, source_file))
+            for bypass_units, compact in [(False, False), (True, False), (True, True)]:
+                grammar = Grammar(token_file, grammar_file, bypass_units=bypass_units)
+                elapsed = float("inf")
+                for _ in range(repeat):
+                    parser = Parser.from_grammar(grammar, source_file)
+                    start = time.perf_counter()
+                    parser.parse(compact)
+                    elapsed = min(elapsed, time.perf_counter() - start)
+                label = ("bypass" if bypass_units else "no bypass") + (", compact" if compact else "")
+                print(f"unit rules, {name} ({label}): {parser.reductions / tokens:.2f} stack reductions/token, "
+                      f"{parser.unit_reductions / tokens:.2f} bypassed/token, {elapsed * 1000:.1f} ms")
+
+def bench_table_scaling(levels=(50, 100, 200, 400)):
+    """ Times LR automaton construction on layered expression grammars of growing size. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        write_token_spec(token_file)
+
+        for count in levels:
+            write_layered_grammar(grammar_file, count)
+            grammar = Grammar(token_file, grammar_file)
+
+            start = time.perf_counter()
+            states = grammar.compute_parse_table_states()
+            elapsed = time.perf_counter() - start
+            print(f"tables: {count + 1:4} nonterminals, {len(grammar.rules):4} rules, "
+                  f"{len(states):5} states in {elapsed:.3f} s")
+
+def bench_slr_lalr(levels=(50, 200)):
+    """ Compares SLR and LALR(1) table construction on the same grammars. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        write_token_spec(token_file)
+
+        grammars = [("statements", os.path.join(tmp, "statements.txt"))]
+        write_statement_grammar(grammars[0][1])
+        for count in levels:
+            grammars.append((f"{count} levels", os.path.join(tmp, f"layered{count}.txt")))
+            write_layered_grammar(grammars[-1][1], count)
+
+        for name, grammar_file in grammars:
+            results = []
+            for method in ("slr", "lalr"):
+                grammar = Grammar(token_file, grammar_file, method=method)
+                start = time.perf_counter()
+                states = grammar.compute_parse_table_states()
+                elapsed = time.perf_counter() - start
+                results.append(f"{method} {len(states)} states in {elapsed * 1000:.1f} ms")
+            print(f"tables {name:>12}: " + ", ".join(results))
+
+def bench_table_compression(levels=(50, 200, 400)):
+    """ Reports parse table bytes, dense and packed by row displacement. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        write_token_spec(token_file)
+
+        for count in levels:
+            write_layered_grammar(grammar_file, count)
+            start = time.perf_counter()
+            grammar = Grammar(token_file, grammar_file)
+            elapsed = time.perf_counter() - start
+            dense, packed = grammar.table_bytes()
+            print(f"parse tables ({count} levels, {len(grammar.states)} states): "
+                  f"{dense:,} bytes dense -> {packed:,} bytes packed (grammar built in {elapsed:.2f} s)")
+
+def bench_memory(levels=200, num_statements=5000):
+    """ Reports peak traced memory for building tables and for parsing a large file. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        layered_file = os.path.join(tmp, "layered.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_layered_grammar(layered_file, levels)
+        write_statement_grammar(grammar_file)
+        write_source(source_file, num_statements)
+
+        tracemalloc.start()
+        Grammar(token_file, layered_file)
+        build_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        grammar = Grammar(token_file, grammar_file)
+        tracemalloc.start()
+        tree = grammar.parse(source_file)
+        parse_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f"peak memory: tables for {levels} levels {build_peak / 1e6:.1f} MB, "
+          f"parsing {num_statements} statements ({len(tree)} nodes) {parse_peak / 1e6:.1f} MB")
+
+def bench_events(num_statements=5000):
+    """ Compares time and peak traced memory of parse with consuming Parser.events. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_statement_grammar(grammar_file)
+        write_source(source_file, num_statements)
+        grammar = Grammar(token_file, grammar_file)
+
+        def run(label):
+            parser = Parser.from_grammar(grammar, source_file)
+            if label == "tree":
+                return len(parser.parse())
+            return sum(1 for _ in parser.events())
+
+        # timed without tracing, see bench_lexer_buffer
+        results = []
+        for label in ("tree", "events"):
+            start = time.perf_counter()
+            count = run(label)
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            run(label)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append(f"{label} {count} items in {elapsed * 1000:.1f} ms ({peak / 1e3:.0f} KB peak)")
+
+    print(f"parse output ({num_statements} statements): " + ", ".join(results))
+
+def bench_array_tree(num_statements=5000):
+    """ Compares time and retained memory of Node trees with ArrayTree. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_statement_grammar(grammar_file)
+        write_source(source_file, num_statements)
+        grammar = Grammar(token_file, grammar_file)
+
+        # timed without tracing, see bench_lexer_buffer
+        results = []
+        for label in ("nodes", "arrays"):
+            parser = Parser.from_grammar(grammar, source_file)
+            build = parser.parse_tree if label == "nodes" else parser.parse_array
+            start = time.perf_counter()
+            tree = build()
+            count = sum(1 for _ in tree.preorder())
+            elapsed = time.perf_counter() - start
+            del tree
+
+            parser = Parser.from_grammar(grammar, source_file)
+            build = parser.parse_tree if label == "nodes" else parser.parse_array
+            tracemalloc.start()
+            tree = build()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del tree
+            results.append(f"{label} in {elapsed * 1000:.1f} ms ({size / count:.0f} bytes/node)")
+
+    print(f"parse trees ({num_statements} statements, {count} nodes): " + ", ".join(results))
+
+def bench_deep_tree(depth=100000):
+    """ Times parsing and traversing a statement nested depth parentheses deep. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        grammar_file = os.path.join(tmp, "grammar.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_statement_grammar(grammar_file)
+        with open(source_file, "w") as f:
+            f.write("x = " + "(" * depth + "1" + ")" * depth + ";\n")
+        grammar = Grammar(token_file, grammar_file)
+
+        start = time.perf_counter()
+        root = Parser.from_grammar(grammar, source_file).parse_tree()
+        parse_elapsed = time.perf_counter() - start
+
+        # the depth is measured with an explicit stack too
+        tree_depth = 0
+        stack = [(root, 1)]
+        while len(stack) > 0:
+            node, node_depth = stack.pop()
+            tree_depth = max(tree_depth, node_depth)
+            stack.extend((child, node_depth + 1) for child in node.children)
+
+        start = time.perf_counter()
+        count = sum(1 for _ in root.preorder())
+        trav_elapsed = time.perf_counter() - start
+
+    print(f"deep tree ({depth} nested parentheses, depth {tree_depth}): parsed in {parse_elapsed:.2f} s, "
+          f"{count} nodes in preorder in {trav_elapsed * 1000:.1f} ms")
+
+def bench_automata():
+    """ Reports DFA states, alphabet classes and table bytes before and after minimization. """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, "tokens.txt")
+        source_file = os.path.join(tmp, "src.txt")
+        write_token_spec(token_file)
+        write_source(source_file, 1)
+        lex = Lex(token_file, source_file)
+
+        automata = [(key, lex.regex_dic[key][1].get_dfa()) for key in lex.token_types]
+        automata.append(("<scanner>", lex.make_scanner()))
+
+    for key, dfa in automata:
+        minimal = dfa.minimize()
+        minimal.make_table()
+        print(f"{key:>10}: {dfa.num_states:4} -> {minimal.num_states:4} states, "
+              f"{len(minimal.alphabet)} symbols -> {minimal.ncols} classes, "
+              f"table {dfa.table_bytes():6} -> {minimal.table_bytes():5} bytes")
+
+def keywords(count, seed=0):
+    """ Returns count distinct random lowercase words, like a language's keyword list. """
+
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 9))))
+    return sorted(words)
+
+def bench_subset_construction(counts=(25, 50, 100, 200, 400)):
+    """ Times NFA.to_DFA on the alternation of a growing list of keywords. """
+
+    for count in counts:
+        reg = RegEx()
+        reg.alphabet = LETTERS
+        reg.expr = "|".join(keywords(count))
+        nfa = reg.to_nfa()
+
+        start = time.perf_counter()
+        dfa = nfa.to_DFA()
+        elapsed = time.perf_counter() - start
+
+        print(f"to_DFA: {count:4} keywords, {nfa.numStates:5} NFA states -> "
+              f"{dfa.num_states:5} DFA states in {elapsed * 1000:.1f} ms")
+
+def bench_regex_construction(counts=(25, 100, 400)):
+    """ Compares compile time and DFA size of the NFA and followpos routes in RegEx.get_dfa. """
+
+    letter = alternation(LETTERS)
+    digit = alternation(DIGITS)
+    exprs = [("identifier", f"{letter}({letter}|{digit})*")]
+    exprs += [(f"{count} keywords", "|".join(keywords(count))) for count in counts]
+
+    for name, expr in exprs:
+        results = []
+        for construction in ("nfa", "followpos"):
+            reg = RegEx()
+            reg.alphabet = ALPHABET
+            reg.expr = expr
+            reg.construction = construction
+
+            start = time.perf_counter()
+            dfa = reg.get_dfa()
+            elapsed = time.perf_counter() - start
+            results.append(f"{construction} {elapsed * 1000:7.1f} ms / {dfa.num_states:5} states")
+        print(f"get_dfa {name:>14}: " + ", ".join(results))
+
+def bench_dfa_simulate(length=200000):
+    """ Times DFA.simulate per character on a long identifier-like string. """
+
+    reg = RegEx()
+    reg.alphabet = ALPHABET
+    reg.expr = f"{alternation(LETTERS)}({alternation(LETTERS)}|{alternation(DIGITS)})*"
+    dfa = reg.get_dfa().minimize()
+
+    rng = random.Random(0)
+    text = "a" + "".join(rng.choice(LETTERS + DIGITS) for _ in range(length - 1))
+
+    start = time.perf_counter()
+    dfa.simulate(text)
+    elapsed = time.perf_counter() - start
+    print(f"DFA.simulate: {length} chars in {elapsed * 1000:.1f} ms "
+          f"({elapsed * 1e9 / length:.0f} ns/char)")
+
+if __name__ == "__main__":
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bench_lexer_compile_once()
+    bench_lexer(statements, combined=False)
+    bench_lexer(statements)
+    bench_lexer_streaming()
+    bench_lexer_buffer()
+    bench_lexer_cache()
+    bench_parser_cache()
+    bench_parse_many()
+    bench_batch()
+    bench_threads()
+    bench_parse()
+    bench_unit_reductions()
+    bench_table_scaling()
+    bench_slr_lalr()
+    bench_table_compression()
+    bench_memory()
+    bench_events()
+    bench_array_tree()
+    bench_deep_tree()
+    bench_automata()
+    bench_subset_construction()
+    bench_regex_construction()
+    bench_dfa_simulate()
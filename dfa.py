@@ -1,4 +1,5 @@
 import sys
+from array import array
 
 class FileFormatError(Exception):
     """
@@ -9,6 +10,9 @@ class FileFormatError(Exception):
 
     pass
 
+# Prefix of the bytes produced by DFA.dumps (the last byte is the format version)
+DFA_MAGIC = b"LRDFA\x01"
+
 class DFA:
     def __init__(self, *, filename=None):
         """
@@ -26,6 +30,18 @@ class DFA:
         self.startState = 0
         # Last line: Accept states of the DFA
         self.acceptStates = []
+        # Token priority of each accept state, when the DFA is a lexer's
+        # combined scanner (not part of the DFA file format)
+        self.acceptTokens = {}
+        # Dense form of the transitions, built by make_table on first use.
+        # Characters that behave the same in every state share a column:
+        # table[state * ncols + col] is the next state (0 for no transition),
+        # and char_columns[ord(char)] is char's column (-1 if not in the alphabet)
+        self.table = None
+        self.ncols = 0
+        self.char_columns = None
+        self.extra_columns = {}
+        self.accepting = None
  
         if filename != None:
             file = open(filename)
@@ -120,6 +136,363 @@ class DFA:
     def accept_states(self, l):
         self.acceptStates = l
 
+    def dead_states(self):
+        """
+        Returns the set of states from which no accept state can be reached.
+        Once a simulation enters one of these states it can stop early.
+        """
+
+        if self.acceptStates == None:
+            return set(self.transitions.keys())
+
+        # walking the transitions backwards from the accept states
+        reverse = {}
+        for state, row in self.transitions.items():
+            for to_state in row:
+                if to_state != None:
+                    reverse.setdefault(to_state, set()).add(state)
+
+        live = set(self.acceptStates)
+        stack = list(self.acceptStates)
+        while len(stack) > 0:
+            for state in reverse.get(stack.pop(), ()):
+                if state not in live:
+                    live.add(state)
+                    stack.append(state)
+
+        return set(self.transitions.keys()) - live
+
+    def alphabet_classes(self):
+        """
+        Groups the symbols of the alphabet into equivalence classes: two
+        symbols are in the same class if every state moves to the same
+        state on both of them.
+
+        Returns (classes, representatives), where classes[j] is the class
+        of the j-th symbol and representatives[k] is the first symbol
+        in class k.
+        """
+
+        states = sorted(self.transitions.keys())
+
+        classes = [None] * len(self.alphabet)
+        representatives = []
+        class_of_column = {}
+        for j in range(len(self.alphabet)):
+            column = tuple(self.transitions[state][j] if j < len(self.transitions[state]) else None
+                           for state in states)
+            if column not in class_of_column:
+                class_of_column[column] = len(representatives)
+                representatives.append(j)
+            classes[j] = class_of_column[column]
+
+        return classes, representatives
+
+    def minimize(self):
+        """
+        Returns an equivalent DFA with the fewest possible states, using
+        Hopcroft's partition refinement.  Unreachable states are dropped,
+        and accept states tagged with different tokens are never merged.
+        A missing (None) transition is treated as a move to a sink state.
+        """
+
+        ncols = len(self.alphabet)
+        accept = set(self.acceptStates) if self.acceptStates != None else set()
+
+        # symbols in the same class can never split a block differently
+        classes, representatives = self.alphabet_classes()
+
+        # only states reachable from the start state take part
+        reachable = {self.startState}
+        stack = [self.startState]
+        while len(stack) > 0:
+            for to_state in self.transitions.get(stack.pop(), [None] * ncols):
+                if to_state != None and to_state not in reachable:
+                    reachable.add(to_state)
+                    stack.append(to_state)
+
+        # 0 is the sink standing in for missing transitions
+        def target(state, col):
+            if state == 0 or state not in self.transitions:
+                return 0
+            to_state = self.transitions[state][col]
+            return 0 if to_state == None else to_state
+
+        states = sorted(reachable) + [0]
+
+        # inverse[k][state] = states that move to state on class k
+        inverse = [{} for _ in representatives]
+        for state in states:
+            for k, col in enumerate(representatives):
+                inverse[k].setdefault(target(state, col), set()).add(state)
+
+        # initial partition: non-accepting states, then one block per token
+        groups = {}
+        for state in states:
+            if state in accept:
+                key = ("accept", self.acceptTokens.get(state))
+            else:
+                key = ("reject",)
+            groups.setdefault(key, set()).add(state)
+        blocks = list(groups.values())
+        block_of = {}
+        for i, block in enumerate(blocks):
+            for state in block:
+                block_of[state] = i
+
+        work = set(range(len(blocks)))
+        while len(work) > 0:
+            splitter = set(blocks[work.pop()])
+            for k in range(len(representatives)):
+                # states in each block that move into the splitter on class k
+                touched = {}
+                for state in splitter:
+                    for from_state in inverse[k].get(state, ()):
+                        touched.setdefault(block_of[from_state], set()).add(from_state)
+
+                for i, inside in touched.items():
+                    if len(inside) == len(blocks[i]):
+                        continue
+                    outside = blocks[i] - inside
+                    blocks[i] = inside
+                    blocks.append(outside)
+                    for state in outside:
+                        block_of[state] = len(blocks) - 1
+
+                    if i in work:
+                        work.add(len(blocks) - 1)
+                    elif len(inside) <= len(outside):
+                        work.add(i)
+                    else:
+                        work.add(len(blocks) - 1)
+
+        # numbering the blocks 1, 2, ... in breadth first order from the start
+        sink_block = block_of[0]
+        number = {block_of[self.startState]: 1}
+        order = [block_of[self.startState]]
+        i = 0
+        while i < len(order):
+            state = next(iter(blocks[order[i]]))
+            for col in range(ncols):
+                to_block = block_of[target(state, col)]
+                if to_block not in number and not (to_block == sink_block and blocks[to_block] == {0}):
+                    number[to_block] = len(order) + 1
+                    order.append(to_block)
+            i += 1
+
+        d = DFA()
+        d.alphabet = self.alphabet
+        d.alphabet_list = list(self.alphabet_list)
+        d.numStates = len(order)
+        d.startState = 1
+        for i, block in enumerate(order):
+            state = next(iter(blocks[block]))
+            row = []
+            for col in range(ncols):
+                to_block = block_of[target(state, col)]
+                row.append(number.get(to_block))
+            d.transitions[i + 1] = row
+            if state in accept:
+                d.acceptStates.append(i + 1)
+                if state in self.acceptTokens:
+                    d.acceptTokens[i + 1] = self.acceptTokens[state]
+
+        if self.acceptStates == None:
+            d.acceptStates = None
+
+        return d
+
+    def make_table(self):
+        """
+        Builds the dense transition table used by transition and simulate
+        from self.alphabet, self.transitions and self.acceptStates.  Must
+        be called again if those are changed after the DFA has been used.
+
+        The table is built aside and self.table is set last, so a thread
+        that finds self.table set never sees it partly filled.
+        """
+
+        classes, representatives = self.alphabet_classes()
+        ncols = len(representatives)
+
+        # character -> column (its class), as a flat array for 8-bit characters
+        char_columns = array("i", [-1] * 256)
+        extra_columns = {}
+        for j, char in enumerate(self.alphabet):
+            if ord(char) < 256:
+                if char_columns[ord(char)] == -1:
+                    char_columns[ord(char)] = classes[j]
+            elif char not in extra_columns:
+                extra_columns[char] = classes[j]
+
+        # row 0 stands for a missing state, so every move from it fails
+        size = max([self.numStates, self.startState] + list(self.transitions.keys()))
+        table = array("i", [0] * ((size + 1) * ncols))
+        for state, row in self.transitions.items():
+            for col, j in enumerate(representatives):
+                if j < len(row) and row[j] != None and row[j] in self.transitions:
+                    table[state * ncols + col] = row[j]
+
+        accepting = bytearray(size + 1)
+        if self.acceptStates != None:
+            for state in self.acceptStates:
+                if 0 <= state <= size:
+                    accepting[state] = 1
+
+        self.ncols = ncols
+        self.char_columns = char_columns
+        self.extra_columns = extra_columns
+        self.accepting = accepting
+        self.table = table
+
+    def table_bytes(self):
+        """
+        Returns the size in bytes of the dense transition table
+        and character map built by make_table.
+        """
+
+        if self.table == None:
+            self.make_table()
+
+        return (len(self.table) * self.table.itemsize
+                + len(self.char_columns) * self.char_columns.itemsize
+                + len(self.accepting))
+
+    def dumps(self):
+        """
+        Returns the DFA (its dense table, alphabet, start and accept
+        states and accept tokens) as bytes that loads can read back,
+        so a compiled DFA can be cached on disk.
+        """
+
+        if self.table == None:
+            self.make_table()
+
+        classes = [self.column(char) for char in self.alphabet]
+        accept = self.acceptStates if self.acceptStates != None else []
+        tokens = sorted(self.acceptTokens.items())
+        alphabet = self.alphabet.encode("utf-8")
+
+        ints = array("i", [self.numStates, self.startState, self.ncols, len(alphabet),
+                           len(self.table), -1 if self.acceptStates == None else len(accept),
+                           len(tokens)])
+        ints.extend(classes)
+        ints.extend(self.table)
+        ints.extend(accept)
+        for state, token in tokens:
+            ints.extend((state, token))
+
+        # stored little-endian whatever the machine
+        if sys.byteorder == "big":
+            ints.byteswap()
+
+        return DFA_MAGIC + ints.tobytes() + alphabet
+
+    @staticmethod
+    def loads(data):
+        """
+        Returns the DFA stored in data by dumps.
+        Raises FileFormatError if data is not a dumped DFA.
+        """
+
+        if data[:len(DFA_MAGIC)] != DFA_MAGIC:
+            raise FileFormatError
+
+        try:
+            pos = len(DFA_MAGIC)
+            head = array("i")
+            head.frombytes(data[pos:pos + 7 * head.itemsize])
+            if sys.byteorder == "big":
+                head.byteswap()
+            num_states, start, ncols, alphabet_len, table_len, accept_len, token_len = head
+            if min(num_states, start, ncols, alphabet_len, table_len, token_len) < 0 or accept_len < -1 \
+                    or alphabet_len > len(data) - pos:
+                raise FileFormatError
+
+            # the ints run up to the utf-8 alphabet at the end
+            body = array("i")
+            body_bytes = len(data) - pos - alphabet_len
+            body.frombytes(data[pos:pos + body_bytes])
+            if sys.byteorder == "big":
+                body.byteswap()
+            alphabet = data[pos + body_bytes:].decode("utf-8")
+            body = body[len(head):]
+
+            # the counts in the header must account for every int, and
+            # every state number must be a row of the table
+            if len(body) != len(alphabet) + table_len + max(accept_len, 0) + 2 * token_len:
+                raise FileFormatError
+            if ncols > 0:
+                if table_len % ncols != 0:
+                    raise FileFormatError
+                size = table_len // ncols - 1
+            elif table_len == 0 and len(alphabet) == 0:
+                size = max(num_states, start)
+            else:
+                raise FileFormatError
+            if num_states > size or start > size:
+                raise FileFormatError
+
+            d = DFA()
+            d.alphabet = alphabet
+            d.make_alphabet_list()
+            d.numStates = num_states
+            d.startState = start
+            d.ncols = ncols
+
+            classes = body[:len(alphabet)]
+            body = body[len(alphabet):]
+            d.table = body[:table_len]
+            body = body[table_len:]
+            if accept_len == -1:
+                d.acceptStates = None
+            else:
+                d.acceptStates = list(body[:accept_len])
+                body = body[accept_len:]
+            for i in range(token_len):
+                d.acceptTokens[body[2 * i]] = body[2 * i + 1]
+
+            if any(not 0 <= col < ncols for col in classes) \
+                    or any(not 0 <= state <= size for state in d.table) \
+                    or any(not 0 <= state <= size for state in d.acceptStates or []) \
+                    or any(not 0 <= state <= size or token < 0 for state, token in d.acceptTokens.items()):
+                raise FileFormatError
+        except (ValueError, IndexError, UnicodeDecodeError):
+            raise FileFormatError
+
+        d.char_columns = array("i", [-1] * 256)
+        for j, char in enumerate(d.alphabet):
+            if ord(char) < 256:
+                if d.char_columns[ord(char)] == -1:
+                    d.char_columns[ord(char)] = classes[j]
+            elif char not in d.extra_columns:
+                d.extra_columns[char] = classes[j]
+
+        d.accepting = bytearray(size + 1)
+        for state in d.acceptStates or []:
+            d.accepting[state] = 1
+
+        # the per character transitions, for everything that is not table driven
+        for state in range(1, num_states + 1):
+            row = [d.table[state * ncols + classes[j]] if ncols > 0 else 0 for j in range(len(alphabet))]
+            d.transitions[state] = [to_state if to_state != 0 else None for to_state in row]
+
+        return d
+
+    def column(self, symbol):
+        """
+        Returns the column of the transition table for symbol,
+        or -1 if symbol is not in the alphabet.
+        """
+
+        if self.table == None:
+            self.make_table()
+
+        code = ord(symbol)
+        if code < 256:
+            return self.char_columns[code]
+        return self.extra_columns.get(symbol, -1)
+
     def transition(self, state, symbol):
         """
         Returns the state to transition to from "state" on in input symbol "symbol".
@@ -129,16 +502,14 @@ class DFA:
         """
 
         # what state should we transition to
-        index = self.alphabet.index(symbol)
-        transition_states = self.transitions[state]
-
-        return transition_states[index]
-        
-        # making sure the state exists
-        if (curState == None):
-            raise FileFormatError
-        elif curState not in self.transitions.keys():
-            raise FileFormatError
+        col = self.column(symbol)
+        if col == -1:
+            raise ValueError(f"{symbol!r} is not in the alphabet")
+
+        to_state = self.table[state * self.ncols + col]
+        if to_state == 0:
+            return None
+        return to_state
         
     def simulate(self, test_string):
         """
@@ -153,31 +524,33 @@ class DFA:
         if self.acceptStates == None:
             return False
 
-        curState = self.startState
+        if self.table == None:
+            self.make_table()
 
-        try:
+        table = self.table
+        ncols = self.ncols
+        char_columns = self.char_columns
+        curState = self.startState
 
-            # iterating through the string
-            for letter in test_string:
+        # iterating through the string
+        for letter in test_string:
 
-                # what state should we transition to
-                index = self.alphabet.index(letter)
-                transition_states = self.transitions[curState]
+            # what column of the table is this letter
+            code = ord(letter)
+            if code < 256:
+                col = char_columns[code]
+            else:
+                col = self.extra_columns.get(letter, -1)
+            if col == -1:
+                raise FileFormatError
 
-                curState = transition_states[index]
-                
-                # making sure the state exists
-                if (curState == None):
-                    raise FileFormatError
-                elif curState not in self.transitions.keys():
-                    raise FileFormatError
+            curState = table[curState * ncols + col]
 
-        except ValueError:
-            raise FileFormatError
+            # making sure the state exists
+            if curState == 0:
+                raise FileFormatError
 
-        if curState in self.acceptStates:
-            return True
-        return False
+        return self.accepting[curState] == 1
 
 if __name__ == "__main__":
     # You can run your dfa.py code directly from a
@@ -1,7 +1,26 @@
-from dfa import DFA
+import copy
+import hashlib
+import io
+import mmap
+import os
+import re
+import sys
+import tempfile
+from array import array
+
+from dfa import DFA, FileFormatError
 from nfa import NFA as nfa
 from reg import RegEx
 
+# Prefix of compiled scanner cache files (the last byte is the format version)
+CACHE_MAGIC = b"LRLEX\x01"
+
+# Number of characters the lexer reads from the source file at a time
+CHUNK_SIZE = 1 << 16
+
+# Encoding of strings as arrays of character codes (see Lex.codes)
+CODES_ENCODING = "utf-32-le" if sys.byteorder == "little" else "utf-32-be"
+
 class InvalidToken(Exception):
 	""" 
 	Raised if while scanning for a token,
@@ -11,31 +30,91 @@ class InvalidToken(Exception):
 	"""
 	pass
 
+def map_file(filename):
+	"""
+	Returns the contents of the file filename memory-mapped read only,
+	as a buffer for Lex.for_buffer.  Pages are read from the file as
+	they are scanned, so the file is never copied into memory.
+	"""
+
+	with open(filename, "rb") as f:
+		# an empty file cannot be mapped
+		if os.fstat(f.fileno()).st_size == 0:
+			return b""
+		return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
 class Lex:
-	def __init__(self, regex_file, source_file):
+	def __init__(self, regex_file, source_file, combined=True, cache_dir=None):
 		"""
 		Initializes a lexical analyzer.  regex_file
 		contains specifications of the types of tokens, 
 		and source_file.
 		is the text file that tokens are returned from.
+		If combined is True, every token regex is unioned into
+		a single scanner DFA; otherwise each token type keeps
+		its own DFA and they are tried one after another.
+		If cache_dir is given, the combined scanner is loaded from
+		a file there keyed by a hash of regex_file, and compiled
+		and saved there if no valid file exists.
+		source_file may be None for a lexer that is only used
+		to make lexers for other sources with for_source.
 		"""
 
 		self.alphabet = ""
 		self.token_list = []
 		self.token_num = 0
+		self.combined = combined
+
+		# the generator next_token takes tokens from, see tokens
+		self.token_stream = None
+		self.chunk_size = CHUNK_SIZE
+
+		# the bytes-like source of a lexer made with for_buffer, or None
+		self.buffer = None
+
+		# whether the last token scanned was "INVALID", and where the last scan stopped (see scan)
+		self.last_invalid = False
+		self.scan_position = 0
+
+		# the text of a source file that spans is scanning, from offset window_start of the file
+		self.window = ""
+		self.window_start = 0
+
+		# if a list, spans appends each chunk of the source file it reads to it
+		self.source_chunks = None
 
 		# a dic where dic = {TOKEN_TYPE: (regex, reg)}
 		self.regex_dic = {}
-		
-		regex_f = open(regex_file, "r")
-		self.source_f = open(source_file, "r")
+
+		# token types in the order of the token spec (their priority)
+		self.token_types = []
+
+		# a dic where dic = {TOKEN_TYPE: dfa}, compiled once from regex_dic
+		self.dfa_dic = {}
+
+		# a dic where dic = {TOKEN_TYPE: code}, set by set_token_codes
+		self.token_codes = None
+
+		# the cache key is the hash of the token spec's contents
+		with open(regex_file, "rb") as f:
+			self.spec_hash = hashlib.sha256(f.read()).digest()
+
+		with open(regex_file, "r") as regex_f:
+			spec_lines = regex_f.readlines()
+		self.source_f = open(source_file, "r") if source_file != None else io.StringIO("")
 
 		# reading the alphabet
-		line = regex_f.readline().strip()
+		line = spec_lines[0].strip() if len(spec_lines) > 0 else ""
 		self.alphabet = line[line.find('"') + 1: line.rfind('"')]
+
+		# patterns for a run of non-whitespace, in buffers, where each byte
+		# is one character (as in Latin-1), and in text
+		spaces = bytes(code for code in range(256) if chr(code).isspace())
+		self.word_pattern = re.compile(b"[^" + re.escape(spaces) + b"]+")
+		self.text_word_pattern = re.compile(r"\S+")
  
-		# making the regex_dic by reading in regex_f
-		for line in regex_f:
+		# making the regex_dic from the rest of the spec
+		for line in spec_lines[1:]:
 			line = line.strip().split()
 			expression = line[1][line[1].find('"') + 1: line[1].rfind('"')]
 
@@ -45,6 +124,354 @@ class Lex:
 			reg.expr = expression
 
 			self.regex_dic[line[0]] = (expression, reg)
+			self.token_types.append(line[0])
+
+		# compiling the regexes once, so scanning never rebuilds them
+		if self.combined:
+			self.scanner = None
+			if cache_dir != None:
+				cache_file = os.path.join(cache_dir, f"lex-{self.spec_hash.hex()[:16]}.bin")
+				self.scanner = self.load_scanner(cache_file)
+
+			if self.scanner == None:
+				self.scanner = self.make_scanner().minimize()
+				if cache_dir != None:
+					# the cache is only an optimization, so a failed write is not an error
+					try:
+						self.save_scanner(cache_file)
+					except OSError:
+						pass
+
+			self.make_scanner_table()
+		else:
+			# with their tables, so lexers sharing them never modify them
+			for key in self.token_types:
+				self.dfa_dic[key] = self.regex_dic[key][1].get_dfa().minimize()
+				self.dfa_dic[key].make_table()
+
+			# tried one after another, in priority order
+			self.automata = []
+			for key in self.token_types:
+				dfa = self.dfa_dic[key]
+				self.automata.append(self.make_automaton(dfa, [key if accept else None for accept in dfa.accepting]))
+
+	def make_scanner(self):
+		"""
+		Builds one DFA for all token types by unioning their NFAs
+		under a new start state.  The accept states of the DFA are
+		tagged (in acceptTokens) with the index in token_types of the
+		token they recognize; when several tokens match, the one listed
+		first in the token spec wins.
+		"""
+
+		scanner = nfa()
+		scanner.alphabet = self.alphabet + "e"
+		scanner.numStates = 1
+		scanner.startState = [1]
+		scanner.transitions[1] = [None] * len(scanner.alphabet)
+		scanner.transitions[1][-1] = []
+
+		for priority, key in enumerate(self.token_types):
+			part = self.regex_dic[key][1].get_nfa()
+			offset = scanner.numStates
+
+			# shifting the state numbers of the token's nfa past the ones already used
+			for state, row in part.transitions.items():
+				new_row = [None] * len(scanner.alphabet)
+				for i in range(len(row)):
+					if row[i] != None:
+						new_row[i] = [item + offset for item in row[i]]
+				scanner.transitions[state + offset] = new_row
+
+			# epsilon transition from the new start state
+			scanner.transitions[1][-1].append(part.startState[0] + offset)
+
+			for item in part.acceptStates:
+				scanner.acceptStates.append(item + offset)
+				scanner.acceptTokens[item + offset] = priority
+
+			scanner.numStates += part.numStates
+
+		return scanner.to_DFA()
+
+	def load_scanner(self, cache_file):
+		"""
+		Returns the scanner DFA stored in cache_file, or None if
+		the file is missing, from another format version, for a
+		different token spec, unreadable, truncated or corrupted.
+		"""
+
+		try:
+			with open(cache_file, "rb") as f:
+				data = f.read()
+		except OSError:
+			return None
+
+		header = CACHE_MAGIC + self.spec_hash
+		if data[:len(header)] != header:
+			return None
+
+		try:
+			scanner = DFA.loads(data[len(header):])
+		except FileFormatError:
+			return None
+
+		# every accept state must be tagged with one of the token types
+		if any(priority >= len(self.token_types) for priority in scanner.acceptTokens.values()):
+			return None
+		return scanner
+
+	def save_scanner(self, cache_file):
+		"""
+		Writes the scanner DFA to cache_file.  The file is written
+		under a temporary name and then renamed, so other processes
+		never see a partially written cache.
+		"""
+
+		os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+		f = tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_file) or ".", delete=False)
+		try:
+			with f:
+				f.write(CACHE_MAGIC + self.spec_hash + self.scanner.dumps())
+			os.replace(f.name, cache_file)
+		except OSError:
+			os.unlink(f.name)
+			raise
+
+	def make_scanner_table(self):
+		"""
+		Prepares the scanner DFA's dense table for longest_match:
+		automata is the scanner alone, and scanner_tokens[state] is
+		the token type accepted in state (None if state is not an
+		accept state).
+		"""
+
+		self.scanner.make_table()
+		self.scanner_tokens = [None] * len(self.scanner.accepting)
+		for state, priority in self.scanner.acceptTokens.items():
+			self.scanner_tokens[state] = self.token_types[priority]
+		self.automata = [self.make_automaton(self.scanner, self.scanner_tokens)]
+
+	def make_automaton(self, dfa, tokens):
+		"""
+		Returns the tables longest_match walks for dfa, as a tuple
+		(table, ncols, char_columns, extra_columns, start state, tokens):
+		the table and character columns of dfa (extra_columns keyed by
+		character code), with moves into a dead state replaced by 0 (no
+		transition), so a walk stops as soon as no longer token is
+		possible.  tokens[state] is the token type accepted in state,
+		or None.
+		"""
+
+		if dfa.table == None:
+			dfa.make_table()
+		dead = dfa.dead_states()
+		table = array("i", [0 if state in dead else state for state in dfa.table])
+		extra_columns = {ord(char): col for char, col in dfa.extra_columns.items()}
+		return (table, dfa.ncols, dfa.char_columns, extra_columns, dfa.startState, tuple(tokens))
+
+	def codes(self, text):
+		"""
+		Returns the character codes of the string text as an array,
+		which longest_match scans like a bytes-like buffer.
+		"""
+
+		codes = array("I")
+		if codes.itemsize == 4:
+			codes.frombytes(text.encode(CODES_ENCODING))
+		else:
+			codes.extend(map(ord, text))
+		return codes
+
+	def longest_match(self, codes, start_index, end_index):
+		"""
+		Finds the longest token starting at codes[start_index] and
+		ending at or before codes[end_index], where codes is a sequence
+		of character codes: a bytes-like buffer (each byte one character)
+		or the codes of a string (see codes).  When several token types
+		match the longest token, the first in the token spec wins.
+
+		Returns (match, stop): match is (token type, end index), where
+		the token is codes[start_index:end index], or None if no token
+		matches; stop is the index where the scan stopped, which is
+		end_index if a longer token could follow from codes past
+		end_index.
+		"""
+
+		match = None
+		stop = start_index
+
+		# one left to right walk of each automaton, remembering the last accept
+		for table, ncols, char_columns, extra_columns, state, tokens in self.automata:
+			for index in range(start_index, end_index):
+				code = codes[index]
+				col = char_columns[code] if code < 256 else extra_columns.get(code, -1)
+				if col == -1:
+					break
+				state = table[state * ncols + col]
+				if state == 0:
+					break
+				if tokens[state] != None and (match == None or index >= match[1]):
+					match = (tokens[state], index + 1)
+			else:
+				index = end_index
+			if index > stop:
+				stop = index
+
+		return (match, stop)
+
+	def scan(self, data, codes, start, end, final):
+		"""
+		Generator of the tokens of data[start:end], a string or a
+		bytes-like buffer whose character codes are codes, as (token
+		type, start, end) tuples with indexes into data, with "INVALID"
+		where a valid token cannot be identified: one for each run of
+		such characters, so not right after another "INVALID", which
+		the last one from the previous scan counts as (last_invalid).
+		Tokens never contain whitespace.
+
+		If final is False, data continues past end, so a token that
+		might continue past end is not resolved: the scan stops at its
+		start.  When the generator is done, scan_position is where the
+		tokens not resolved start, or end.
+		"""
+
+		longest_match = self.longest_match
+		pattern = self.text_word_pattern if type(data) == str else self.word_pattern
+
+		# iterating through each run of non-whitespace characters
+		for word in pattern.finditer(data, start, end):
+			index, word_end = word.span()
+			while index < word_end:
+				match, stop = longest_match(codes, index, word_end)
+				if stop == end and not final:
+					self.scan_position = index
+					return
+
+				# if there are no valids, scanning again from the next character
+				if match == None:
+					if not self.last_invalid:
+						self.last_invalid = True
+						yield "INVALID"
+					index += 1
+
+				else:
+					self.last_invalid = False
+					yield (match[0], index, match[1])
+					index = match[1]
+
+		self.scan_position = end
+
+	def for_buffer(self, buffer):
+		"""
+		Returns a new lexical analyzer, like for_source, that scans a
+		bytes-like buffer (bytes, bytearray, memoryview or mmap, see
+		map_file) in place instead of reading a file.  Each byte is one
+		character, as in Latin-1.  spans() gives its tokens without
+		copying any text; next_token makes the text of each token.
+		"""
+
+		lex = self.for_source()
+		lex.buffer = buffer
+		return lex
+
+	def spans(self):
+		"""
+		Generator of the tokens of the source, as (token type, start,
+		end) tuples where start and end are the offsets of the token in
+		the source (in characters, or in bytes for a buffer), with
+		"INVALID" where a valid token cannot be identified (see scan).
+		Nothing is copied out of a buffer (see for_buffer); token_text
+		gives the text of the last token generated.
+		"""
+
+		self.last_invalid = False
+		if self.buffer != None:
+			yield from self.scan(self.buffer, self.buffer, 0, len(self.buffer), True)
+			return
+
+		try:
+			# the text read and not yet scanned past, from the start of a
+			# token that was not resolved at the end of the last chunk
+			self.window = ""
+			self.window_start = 0
+			size = self.chunk_size
+
+			while True:
+				chunk = self.source_f.read(size)
+				final = chunk == ""
+				if self.source_chunks != None:
+					self.source_chunks.append(chunk)
+				data = self.window + chunk
+				base = self.window_start
+				self.window = data
+				for token in self.scan(data, self.codes(data), 0, len(data), final):
+					if token == "INVALID":
+						yield token
+					else:
+						yield (token[0], base + token[1], base + token[2])
+				if final:
+					return
+
+				self.window = data[self.scan_position:]
+				self.window_start = base + self.scan_position
+
+				# when a token is longer than a chunk, the chunks grow, so it
+				# is scanned again only as many times as it doubles in length
+				size = self.chunk_size if self.scan_position > 0 else 2 * size
+		finally:
+			self.source_f.close()
+
+	def token_text(self, start, end):
+		"""
+		Returns the text of the token at start:end of the source, the
+		last one generated by spans (or any span of a buffer).
+		"""
+
+		if self.buffer != None:
+			return self.text(self.buffer, start, end)
+		return self.window[start - self.window_start:end - self.window_start]
+
+	def text(self, buffer, start, end):
+		"""
+		Returns buffer[start:end] as a string (each byte one character).
+		"""
+
+		return str(buffer[start:end], "latin-1")
+
+	def for_source(self, source_file=None, text=None):
+		"""
+		Returns a new lexical analyzer for source_file (or for the
+		string text) that shares this one's compiled automata, so
+		no regex is compiled again.
+		"""
+
+		lex = copy.copy(self)
+		lex.token_list = []
+		lex.token_num = 0
+		lex.token_stream = None
+		lex.buffer = None
+		lex.source_chunks = None
+		if source_file != None:
+			lex.source_f = open(source_file, "r")
+		else:
+			lex.source_f = io.StringIO(text if text != None else "")
+		return lex
+
+	def close(self):
+		"""
+		Closes the source file.  tokens() closes it when the whole
+		file has been read, or when it is closed itself; a Lex can
+		also be used in a with statement.
+		"""
+
+		self.source_f.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
 
 	def make_token_list(self):
 		"""
@@ -59,58 +486,29 @@ class Lex:
 	def make_better_token_list(self):
 		"""
 		Building a list of tokens to iterate through. This time not by space.
+		The whole rest of the source file is read; next_token does not
+		use the list, it takes tokens from tokens() one at a time.
 		"""
 
-		for line in self.source_f:
-			line_list = line.strip().split()
-
-			# iterating through each string in a line
-			for item in line_list:
-				for char in item:
-					if char not in self.alphabet:
-						self.token_list.append("INVALID")
-				start_index = 0
-				end_index = 0
-				valid_up_to = 0
-				valid_type = ""
-
-				# finding a regex within each item
-				while start_index < len(item):
-					while end_index < len(item):
-						if item[end_index] not in self.alphabet:
-							break
-						
-						# testing every regex in the dictionary
-						for key in self.regex_dic.keys():
-							reg = self.regex_dic[key][1]
-
-							# simulating each regex
-							if reg.simulate(item[start_index:end_index+1]):
-								valid_type = key
-								valid_up_to = end_index
-							
-								break
-
-						end_index += 1
-					
-					# if there are no valids
-					if valid_type == "":
-						if len(self.token_list) != 0:
-							if self.token_list[-1] != "INVALID":
-								self.token_list.append("INVALID")
-						else:
-							self.token_list.append("INVALID")
-						
-						start_index = end_index + 1
-
-					# appending the token and token type to the list
-					else:
-						self.token_list.append((valid_type, item[start_index:valid_up_to + 1]))
-						start_index = valid_up_to + 1
-					
-					end_index = start_index
-					valid_up_to = start_index
+		self.token_list.extend(self.tokens())
 
+	def tokens(self):
+		"""
+		Generator of the tokens of the source, as (token type, value)
+		tuples, with "INVALID" where a valid token cannot be identified
+		(see spans and scan).  A source file is read chunk_size
+		characters at a time.  Only the current chunk is held in memory,
+		with the start of a token that might run past its end: that
+		token is scanned again with the next chunk, so the tokens do not
+		depend on where the chunks end.
+		"""
+
+		token_text = self.token_text
+		for span in self.spans():
+			if span == "INVALID":
+				yield span
+			else:
+				yield (span[0], token_text(span[1], span[2]))
 
 	def next_token(self):
 		"""
@@ -125,20 +523,39 @@ class Lex:
 		but there are characters remaining in the source file.
 		"""
 
-		# THIS IS WRITING IT AS IF ALL THE TOKENS ARE SEPARATED BY SPACE ALREADY!!!! this passes most cases
-
-		self.make_better_token_list()
-		# reading next line in file and returning EOFError if no more tokens
-		if self.token_num < len(self.token_list):
-			token = self.token_list[self.token_num]
-			self.token_num += 1
-		else:
+		# tokens are scanned as they are asked for
+		if self.token_stream == None:
+			self.token_stream = self.tokens()
+		token = next(self.token_stream, None)
+		if token == None:
 			raise EOFError
-		
+		self.token_num += 1
+
 		if token == "INVALID":
 			raise InvalidToken
 		return token
 
+	def set_token_codes(self, codes):
+		"""
+		Sets the integer code of each token type for next_token_code.
+		codes is a dic where dic = {TOKEN_TYPE: code}, and must have
+		a code for every token type of the token spec.  Lexers made
+		with for_source use the same codes.
+		"""
+
+		self.token_codes = codes
+
+	def next_token_code(self):
+		"""
+		Returns the next token like next_token, but with the integer
+		code of its token type (see set_token_codes) instead of the
+		name: (code, value).
+		Raises EOFError and InvalidToken like next_token.
+		"""
+
+		token = self.next_token()
+		return (self.token_codes[token[0]], token[1])
+
 
 # You will likely add other classes, drawn from code from your previous 
 # assignments.
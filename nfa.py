@@ -12,6 +12,9 @@ class NFA:
         self.startState = []
         # Last line: Accept states of the DFA
         self.acceptStates = []
+        # Token priority of each accept state, when the NFA is a lexer's
+        # combined scanner (lower number = listed earlier in the token spec)
+        self.acceptTokens = {}
 
         if filename !=None:
             file = open(filename)
@@ -86,114 +89,138 @@ class NFA:
 		created in __init__.
 		"""
 
-        epsilonTrans = {}
+        # the last column of the alphabet is the epsilon transition
+        eps = len(self.alphabet) - 1
+        closure = self.epsilon_closures()
+        accept = set(self.acceptStates)
 
-        # setting up the epsilonTrans dict
-        for state in self.transitions.keys():
-            if self.transitions[state][len(self.alphabet) - 1] != None:
-                epsilonTrans[state] = []
-                for item in self.transitions[state][len(self.alphabet) - 1]:
-                    if item not in epsilonTrans[state]:
-                        epsilonTrans[state].append(item)
-
-        for state in epsilonTrans.keys():
-            for item in epsilonTrans[state]:
-                if item in epsilonTrans.keys():
-                    for s in epsilonTrans[item]:
-                        if s not in epsilonTrans[state]:
-                            epsilonTrans[state].append(s)
-
-        for state in epsilonTrans.keys():
-            if type(epsilonTrans[state]) != int:
-                epsilonTrans[state].sort()
+        # symbols with identical transitions everywhere are only followed once
+        classes, representatives = self.alphabet_classes()
 
         d = dfa.DFA()
-        d.alphabet = ""
-        for item in self.alphabet:
-            if item != "e":
-                d.alphabet += str(item)
+        d.alphabet = self.alphabet[:eps]
+        d.make_alphabet_list()
 
-        # if from the start state, there is epsilon transitions
+        # DFA states are frozensets of NFA states, numbered 1, 2, ... in the
+        # order they are discovered; index finds a state's number in O(1)
+        start = set()
         for state in self.startState:
-            if state in epsilonTrans.keys():
-                for item in epsilonTrans[state]:
-                    if item not in self.startState:
-                        self.startState.append(item)
-        
-        self.startState.sort()
-        new_states = [[0], self.startState]
+            start |= closure[state]
+        start = frozenset(start)
+        index = {start: 1}
+        new_states = [start]
 
-        q = [self.startState]
+        i = 0
+        while i < len(new_states):
+            curState = new_states[i]
 
-        while len(q) > 0:
-            #Pop out the state we need to set up transitions for
-            curState = q.pop(0)
-            
-            # if no states in the cur state to transition from
-            if curState == []:
-                continue
-            
-            # epsilon transition checker
-            #Change
+            # every NFA state reachable from curState on each class of symbols
+            transFunct = [set() for _ in representatives]
             for state in curState:
-                if state in epsilonTrans.keys():
-                    for item in epsilonTrans[state]:
-                        if item not in curState:
-                            curState.append(item)
-
-            curState.sort()
-
-            # make sure that in our DFA transitions dict, we have the curState set up for editing
-            if new_states.index(curState) not in d.transitions.keys():
-                d.transitions[new_states.index(curState)] = [None] * len(d.alphabet)
-
-            # initialize a list of eventual lists that stores each transition based on alphabet value
-            transFunct = [None] * (len(self.alphabet) - 1)
-            for state in curState:
-                # need to check if we even have transitions for this state
-                if state in self.transitions.keys():
-                    for i in range(len(self.transitions[state]) - 1):
-                        if transFunct[i] == None:
-                            transFunct[i] = []
-                        if self.transitions[state][i] != None:
-                            for item in self.transitions[state][i]:
-                                if item not in transFunct[i]:
-                                    transFunct[i].append(item)
-                                    if item in epsilonTrans.keys():
-                                        for s in epsilonTrans[item]:
-                                            if s not in transFunct[i]:
-                                                transFunct[i].append(s)
-
-
-            for i in range(len(transFunct)):
-                transFunct[i].sort()
-                if transFunct[i] not in new_states:
-                    new_states.append(transFunct[i])
-                    q.append(transFunct[i])
-                d.transitions[new_states.index(curState)][i] = new_states.index(transFunct[i])
-
-        d.numStates = len(new_states) - 1
+                if state in self.transitions:
+                    row = self.transitions[state]
+                    for k in range(len(representatives)):
+                        j = representatives[k]
+                        if j < len(row) and row[j] != None:
+                            for item in row[j]:
+                                transFunct[k] |= closure[item]
+
+            class_states = [None] * len(representatives)
+            for k in range(len(representatives)):
+                to_state = frozenset(transFunct[k])
+                if to_state not in index:
+                    new_states.append(to_state)
+                    index[to_state] = len(new_states)
+                class_states[k] = index[to_state]
+            d.transitions[i + 1] = [class_states[classes[j]] for j in range(eps)]
+            i += 1
+
+        d.numStates = len(new_states)
         for i in range(len(new_states)):
-            for item in self.acceptStates:
-                if item in new_states[i]:
-                    d.acceptStates.append(i)
-                    break
+            if not accept.isdisjoint(new_states[i]):
+                d.acceptStates.append(i + 1)
 
-        if d.numStates > len(d.transitions.keys()):
-            reject = 0
-            for i in range(1, len(new_states)):
-                if new_states[i] == []:
-                    reject = i
-            for i in range(1, d.num_states + 1):
-                if i not in d.transitions.keys():
-                    d.transitions[i] = [None] * len(d.alphabet)
-                    for j in range(len(d.alphabet)):
-                        d.transitions[i][j] = reject
+            # a DFA state containing several tagged accept states takes
+            # the token with the highest priority (lowest number)
+            tokens = [self.acceptTokens[item] for item in new_states[i] if item in self.acceptTokens]
+            if len(tokens) != 0:
+                d.acceptTokens[i + 1] = min(tokens)
 
         d.startState = 1
 
         return d
 
+    def alphabet_classes(self):
+        """
+        Groups the symbols of the alphabet (not epsilon) into equivalence
+        classes: two symbols are in the same class if every state has
+        the same transitions on both of them.
+
+        Returns (classes, representatives), where classes[j] is the class
+        of the j-th symbol and representatives[k] is the first symbol
+        in class k.
+        """
+
+        eps = len(self.alphabet) - 1
+        states = sorted(self.transitions.keys())
+
+        classes = [None] * eps
+        representatives = []
+        class_of_column = {}
+        for j in range(eps):
+            # everything that happens on symbol j, in every state
+            column = []
+            for state in states:
+                row = self.transitions[state]
+                if j < len(row) and row[j] != None:
+                    column.append(tuple(sorted(set(row[j]))))
+                else:
+                    column.append(())
+            column = tuple(column)
+
+            if column not in class_of_column:
+                class_of_column[column] = len(representatives)
+                representatives.append(j)
+            classes[j] = class_of_column[column]
+
+        return classes, representatives
+
+    def epsilon_closures(self):
+        """
+        Returns a dict mapping every NFA state to the frozenset of
+        states reachable from it using only epsilon transitions
+        (including the state itself).
+        """
+
+        eps = len(self.alphabet) - 1
+
+        # every state that appears anywhere in the NFA
+        states = set(self.startState) | set(self.acceptStates) | set(self.transitions.keys())
+        for row in self.transitions.values():
+            for targets in row:
+                if targets != None:
+                    states.update(targets)
+
+        closure = {}
+        for state in states:
+            reached = {state}
+            stack = [state]
+            while len(stack) > 0:
+                cur = stack.pop()
+                if cur in closure:
+                    # already closed, no need to walk it again
+                    reached |= closure[cur]
+                    continue
+                row = self.transitions.get(cur)
+                if row != None and len(row) > eps and row[eps] != None:
+                    for item in row[eps]:
+                        if item not in reached:
+                            reached.add(item)
+                            stack.append(item)
+            closure[state] = frozenset(reached)
+
+        return closure
+
 if __name__ == "__main__":
     nfa = NFA(filename = "nfa7.txt")
     d = nfa.to_DFA()
\ No newline at end of file
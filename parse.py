@@ -1,5 +1,15 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+from array import array
+
 from lexer import InvalidToken, Lex
 
+# Format version of parse table cache files
+CACHE_VERSION = 4
+
 # Exception classes defined for the project.
 class NonLRGrammarError(Exception):
     """ Raised when the parser generator detects on non-LR grammar. """
@@ -17,7 +27,12 @@ class Item:
     An item is a single rule from the grammar, plus a dot positioned 
     in the rhs of the rule to indicate how much of the rule has been 
     parsed.
+
+    Items are interned in Grammar.item_table, so there is a single Item
+    object for each (rule, dot_pos) pair of a grammar.
     """
+
+    __slots__ = ("rule", "dot_pos", "hash")
     
     def __init__(self, rule, dot_pos):
         """ Initializes an Item object.
@@ -35,10 +50,13 @@ class Item:
 
         self.rule = rule
         self.dot_pos = dot_pos
+        self.hash = hash((rule.rule_number, dot_pos))
 
     def __eq__(self, other):
         """ Checks for equality of two items.  """
 
+        if self is other:
+            return True
         if self.__class__ != other.__class__:
             return False
         
@@ -47,25 +65,30 @@ class Item:
     def __hash__(self):
         """ Shows how to hash an Item.  
         
-        This then allows an Item to be the key of a dictionary.
+        This then allows an Item to be the key of a dictionary.  The
+        hash is computed once, when the Item is created.
         """
 
-        return hash((self.rule, self.dot_pos))
+        return self.hash
     
 class State:
     """ Represents a single state in the LR Automaton. """
 
-    def __init__(self, items):
+    __slots__ = ("kernel", "action", "goto")
+
+    def __init__(self, kernel):
         """ Initializes a state of the LR Automaton.
         
         Parameters:
-        items: set of Item
-            The set of items that defines the state.
+        kernel: set of Item
+            The kernel items that define the state (the start item, or
+            the items whose dot a goto moved).  The rest of the state's
+            items are given by Grammar.items_closure.
 
         Returns None
         """
 
-        self.items = items
+        self.kernel = kernel
         self.action = {} # Dictionary telling what action to take from
         # the "self" state, given the next terminal in the input.  terminal can
         # also be the end of input symbol.  You will fill in this dictionary later.  
@@ -84,6 +107,8 @@ class State:
 class Rule:
     """ Represents a single rule of the grammar. """
 
+    __slots__ = ("rule", "rule_number", "lhs", "rhs")
+
     def __init__(self, rule, rule_number, lhs, rhs):
         """ Initializes a rule.
         
@@ -107,14 +132,17 @@ class Rule:
         self.lhs = lhs 
         self.rhs = rhs
     
-class Parser:
-    """ Manages parsing of an input file, given the grammar
-        specification, and the specification of the terminals 
-        of the grammar.
+class Grammar:
+    """ The compiled form of a grammar and the specification of its
+        terminals: the lexer's automata and the LR parse tables.
+
+        A Grammar is built once and not modified afterwards, so any
+        number of Parsers can share it, each parsing its own input.
     """
 
-    def __init__(self, lexer_filename, grammar_filename, source_filename):
-        """ Initializes the Parser object.
+    def __init__(self, lexer_filename, grammar_filename, cache_dir=None, method="slr", compress=True,
+                 bypass_units=True):
+        """ Initializes the Grammar object.
         
         Parameters:
         lexer_filename: string
@@ -126,23 +154,56 @@ class Parser:
             Name of file containing specification of the grammar.  (Format
             of this file is specified in pa5 problem statement.)
 
-        source_filename: string
-            Name of the file containing the input to the parser.
+        cache_dir: string or None
+            Directory for cached compiled tables.  If given, the lexer's
+            scanner and the parse tables are loaded from files there keyed
+            by a hash of the token and grammar files, and computed and saved
+            there when no valid file exists.
+
+        method: string
+            How reductions get their lookaheads: "slr" uses the follow set of
+            the rule's lhs, "lalr" computes LALR(1) lookaheads, which accepts
+            more grammars with the same states.
+
+        compress: bool
+            If True, the integer parse tables are packed by row displacement,
+            which takes much less memory for large grammars; otherwise they
+            are stored in full (see make_int_tables).
+
+        bypass_units: bool
+            If True, the parser follows chains of unit reductions (rules
+            like E : T) without pushing and popping each one on its stack.
+            The parse tree is the same either way.
         """
 
+        if method not in ("slr", "lalr"):
+            raise ValueError(f"Unknown parse table method {method}")
+        self.method = method
+        self.compress = compress
+        self.bypass_units = bypass_units
+
         self.end_of_input = "END_OF_INPUT"
         self.dummy_start_symbol = "dummy_start"
         self.start_state_num = 0 # Always 0
         self.epsilon = "eps"  # An epsilon rule in the grammar must have this as its rhs.
         self.accept_action = "accept"
 
-        try:
-            # Create lexical analyzer.  Use code from pa4 for this.
-            self.lexer = Lex(lexer_filename, source_filename)
+        # Create lexical analyzer.  Parsers make their own lexers from it with for_source.
+        self.lexer = Lex(lexer_filename, None, cache_dir=cache_dir)
 
+        # The cache key is the hash of the grammar file's contents.
+        with open(grammar_filename, "rb") as f:
+            self.grammar_hash = hashlib.sha256(f.read()).hexdigest()
+        cache_file = None
+        if cache_dir != None:
+            cache_file = os.path.join(cache_dir, f"parse-{self.grammar_hash[:16]}-{self.method}.json")
+
+        if cache_file == None or not self.load_tables(cache_file):
             # Read the grammar file.
             self.terminals, self.nonterminals, self.rules, self.rules_by_lhs = \
                 self.read_grammar_file(grammar_filename)
+            self.item_table = self.make_item_table(self.rules)
+            self.closure_templates = self.compute_closure_templates()
 
             # Compute first and follow functions for the input grammar.
             self.first = self.compute_first()
@@ -150,9 +211,27 @@ class Parser:
 
             # Compute the parse table for the grammar.
             self.states = self.compute_parse_table_states()
-        
-        except InvalidToken:
-            print(f"Invalid token while processing input file {source_filename}")
+
+            if cache_file != None:
+                # the cache is only an optimization, so a failed write is not an error
+                try:
+                    self.save_tables(cache_file)
+                except OSError:
+                    pass
+
+        # Integer forms of the tables, which the parse loop uses.
+        self.make_int_tables()
+
+    def parse(self, source_filename=None, text=None, compact=False, buffer=None):
+        """ Parses source_filename (or the string text, or the bytes-like
+        buffer, see Lex.for_buffer) with this grammar.
+
+        Returns: list
+            The parse tree, as returned by Parser.parse (without the nodes
+            of unit rules if compact is True).
+        """
+
+        return Parser.from_grammar(self, source_filename, text, buffer).parse(compact)
 
     def read_grammar_file(self, grammar_filename):
         """ Reads the grammar file, initializing instance variables associated with the grammar.
@@ -174,8 +253,8 @@ class Parser:
             List of grammar rules
 
         rules_by_lhs: dict
-            Dictionary mapping grammar nonterminals to set of rules
-            for that nonterminal.
+            Dictionary mapping grammar nonterminals to list of rules
+            for that nonterminal, in the order they appear in the file.
 
         Exceptions raised:
 
@@ -184,8 +263,9 @@ class Parser:
         Returns None.
         """
         try:
-            # Open file                                                                                                           fd
-            f = open(grammar_filename)
+            # Read the file, and close it before the rules are parsed
+            with open(grammar_filename) as grammar_file:
+                f = io.StringIO(grammar_file.read())
 
             # Initialize variables to store grammar.
             terminals = set()
@@ -216,13 +296,13 @@ class Parser:
             nonterminals.add(self.dummy_start_symbol)
             self.dummy_rule = Rule("", rule_number, self.dummy_start_symbol, (rule.lhs,))
             rules.append(self.dummy_rule)
-            rules_by_lhs[self.dummy_start_symbol] = {self.dummy_rule}
+            rules_by_lhs[self.dummy_start_symbol] = [self.dummy_rule]
 
             # Add first rule from file
             rule_number += 1
             nonterminals.add(rule.lhs)
             rules.append(rule)
-            rules_by_lhs[rule.lhs] = {rule}
+            rules_by_lhs[rule.lhs] = [rule]
 
             # Read remaining rules
             while True:
@@ -245,9 +325,9 @@ class Parser:
                 nonterminals.add(rule.lhs)
                 rules.append(rule)
                 if rule.lhs not in rules_by_lhs:
-                    rules_by_lhs[rule.lhs] = {rule}
+                    rules_by_lhs[rule.lhs] = [rule]
                 else:
-                    rules_by_lhs[rule.lhs].add(rule)
+                    rules_by_lhs[rule.lhs].append(rule)
             
             # Return data
             return terminals, nonterminals, rules, rules_by_lhs
@@ -428,41 +508,39 @@ class Parser:
     def compute_parse_table_states(self):
         """ Compute the states of the parse table 
 
-        Returns: set of State
-            Returns set of states of the parse tables.
+        Reductions use the follow set of the rule's lhs when self.method
+        is "slr", and LALR(1) lookaheads when it is "lalr".
+
+        Returns: list of State
+            Returns list of states of the parse tables.
         """
-        # Initialize set of states with start state
-        start_items = {Item(self.rules[0], 0)}
-        start_state = State(self.items_closure(start_items))
-        states = [start_state]
+        states, successors = self.compute_lr0_states()
 
-        i = 0
-        while i < len(states):
+        if self.method == "lalr":
+            lookaheads = self.compute_lalr_lookaheads(states, successors)
 
-            #Get the state we need to generate the action and goto for
-            state = states[i]
+        for i, state in enumerate(states):
+            # Completed items are kernel items, except epsilon items, which are
+            # complete as soon as the closure predicts them; visit them in rule order
+            items = sorted(state.kernel | {item for item in self.items_closure(set(state.kernel))
+                                           if item.rule.rhs[0] == self.epsilon},
+                           key=lambda item: (item.rule.rule_number, item.dot_pos))
 
             #Checking to see if we need to add the end of input transition to the action
-            for item in list(state.items):
+            for item in items:
                 if item.rule.rule_number == 0 and item.dot_pos == 1:
                     if self.end_of_input in state.action.keys():
                         raise NonLRGrammarError
                     state.action[self.end_of_input] = (self.accept_action,)
 
-            #Creating our pre process dict for every item to the right of the dot on the rhs
-            pre_process_dict = {}
-            for item in state.items:
+            for item in items:
                 rule = item.rule
-                #No point in doing anything if the dot pos is at the end
-                if item.dot_pos < len(rule.rhs):
-                    if rule.rhs[item.dot_pos] in pre_process_dict.keys():
-                        pre_process_dict[rule.rhs[item.dot_pos]].append(item)
+                if item.dot_pos == len(rule.rhs) or rule.rhs[0] == self.epsilon:
+                    if self.method == "lalr":
+                        lst = lookaheads.get((i, rule.rule_number), set())
                     else:
-                        pre_process_dict[rule.rhs[item.dot_pos]] = [item]
-
-                if item.dot_pos == len(rule.rhs):
-                    lst = self.follow[rule.lhs]
-                    for key in lst:
+                        lst = self.follow[rule.lhs]
+                    for key in sorted(lst):
                         if key != "eps":
                             if key not in state.action.keys():
                                 state.action[key] = ("reduce", item.rule.rule_number)
@@ -471,40 +549,641 @@ class Parser:
                                 if temp[0] != self.accept_action:
                                     raise NonLRGrammarError
 
-            for key in pre_process_dict.keys():
+            for key, shift_ind in successors[i].items():
                 #Checks to see if we already have a transition for key in action or goto
                 if key in state.action.keys() or key in state.goto.keys():
                     raise NonLRGrammarError
 
+                if key in self.terminals:
+                    state.action[key] = ("shift", shift_ind)
+                elif key != self.end_of_input:
+                    state.goto[key] = shift_ind
+        return states
+
+    def compute_lr0_states(self):
+        """ Compute the states of the LR(0) automaton, without their action
+        and goto tables.
+
+        Returns: (states, successors)
+
+        states: list of State
+            The states, numbered in the order they are discovered.
+
+        successors: list of dict
+            successors[i][symbol] is the index of the state reached from
+            state i on grammar symbol symbol (eps excluded).
+        """
+        # Initialize set of states with start state
+        start_items = {self.make_item(self.rules[0], 0)}
+        start_state = State(start_items)
+        states = [start_state]
+        successors = []
+
+        # A state's closure is determined by its kernel (the items the
+        # goto moved the dot over), so kernels identify states: this maps
+        # each kernel, as a frozenset of (rule_number, dot_pos), to its index.
+        state_index = {self.kernel_key(start_items): 0}
+
+        i = 0
+        while i < len(states):
+
+            #Get the state we need to generate the transitions for
+            state = states[i]
+            successors.append({})
+
+            # Visiting the closure in rule order, so states are numbered the same way on every run
+            items = sorted(self.items_closure(set(state.kernel)), key=lambda item: (item.rule.rule_number, item.dot_pos))
+
+            #Creating our pre process dict for every item to the right of the dot on the rhs
+            pre_process_dict = {}
+            for item in items:
+                rule = item.rule
+                #No point in doing anything if the dot pos is at the end, or for an epsilon rule
+                if item.dot_pos < len(rule.rhs) and rule.rhs[0] != self.epsilon:
+                    if rule.rhs[item.dot_pos] in pre_process_dict.keys():
+                        pre_process_dict[rule.rhs[item.dot_pos]].append(item)
+                    else:
+                        pre_process_dict[rule.rhs[item.dot_pos]] = [item]
+
+            for key in pre_process_dict.keys():
                 lst = pre_process_dict[key]
                 new_items = set()
 
                 # Move the dot position by one to the right
                 for item in lst:
-                    temp = Item(item.rule, item.dot_pos + 1)
+                    temp = self.make_item(item.rule, item.dot_pos + 1)
                     new_items.add(temp)
 
-                # Generate the set of closed items
-                new_items = self.items_closure(new_items)
-
                 # State already exists
-                if self.get_state_index(new_items, states) != None:
-                    shift_ind = self.get_state_index(new_items, states)
-                    if key in self.terminals:
-                        state.action[key] = ("shift", shift_ind)
-                    elif key != "eps" and key != self.end_of_input:
-                        state.goto[key] = shift_ind
+                kernel = self.kernel_key(new_items)
+                if kernel in state_index:
+                    shift_ind = state_index[kernel]
                 # Need to create a new state
                 else:
                     new_state = State(new_items)
                     states.append(new_state)
-                    if key in self.terminals:
-                        state.action[key] = ("shift", len(states) - 1)
-                    elif key != "eps" and key != self.end_of_input:
-                        state.goto[key] = len(states) - 1
+                    shift_ind = len(states) - 1
+                    state_index[kernel] = shift_ind
+
+                successors[i][key] = shift_ind
             i += 1
-        return states
-        
+        return states, successors
+
+    def compute_lalr_lookaheads(self, states, successors):
+        """ Compute LALR(1) lookaheads for the reductions of the LR(0) automaton,
+        using DeRemer and Pennello's relations (reads, includes, lookback).
+
+        Parameters:
+
+        states: list of State
+            States of the LR(0) automaton.
+
+        successors: list of dict
+            Transitions of the LR(0) automaton (see compute_lr0_states).
+
+        Returns: dict
+            key is (state index, rule number) for a rule that can be reduced
+            in that state, value is the set of terminals on which to reduce.
+        """
+
+        def nullable(symbol):
+            return symbol in self.nonterminals and self.epsilon in self.first[symbol]
+
+        def body(rule):
+            # the symbols of an epsilon rule's rhs, as the automaton sees them
+            return () if rule.rhs[0] == self.epsilon else rule.rhs
+
+        # Every transition on a nonterminal, as (state, nonterminal)
+        transitions = []
+        for p in range(len(states)):
+            for symbol in successors[p]:
+                if symbol in self.nonterminals:
+                    transitions.append((p, symbol))
+
+        # Direct reads: terminals shifted right after the transition.  The
+        # end of input is "shifted" by the accept action.
+        direct_reads = {}
+        reads = {}
+        for p, nonterminal in transitions:
+            r = successors[p][nonterminal]
+            direct_reads[(p, nonterminal)] = {symbol for symbol in successors[r] if symbol in self.terminals}
+            for item in states[r].kernel:
+                if item.rule.rule_number == 0 and item.dot_pos == 1:
+                    direct_reads[(p, nonterminal)].add(self.end_of_input)
+            reads[(p, nonterminal)] = [(r, symbol) for symbol in successors[r] if nullable(symbol)]
+
+        read = self.digraph(transitions, reads, direct_reads)
+
+        # includes: (p, A) includes (p', B) if B : beta A gamma, gamma is
+        # nullable and p' reaches p on beta.  lookback: (q, B : omega) looks
+        # back to (p', B) if p' reaches q on omega.
+        # nullable_tail[rule number]: symbols of the rule from this index on are all nullable
+        nullable_tail = []
+        for rule in self.rules:
+            symbols = body(rule)
+            tail = len(symbols)
+            while tail > 0 and nullable(symbols[tail - 1]):
+                tail -= 1
+            nullable_tail.append(tail)
+
+        includes = {}
+        lookback = {}
+        for p_start, lhs in transitions:
+            for rule in self.rules_by_lhs[lhs]:
+                symbols = body(rule)
+                p = p_start
+                for j, symbol in enumerate(symbols):
+                    if symbol in self.nonterminals and j + 1 >= nullable_tail[rule.rule_number]:
+                        includes.setdefault((p, symbol), []).append((p_start, lhs))
+                    p = successors[p][symbol]
+                lookback.setdefault((p, rule.rule_number), []).append((p_start, lhs))
+
+        follow = self.digraph(transitions, includes, read)
+
+        lookaheads = {}
+        for key, targets in lookback.items():
+            lookaheads[key] = set()
+            for target in targets:
+                lookaheads[key] |= follow[target]
+        return lookaheads
+
+    def digraph(self, nodes, relation, base):
+        """ DeRemer and Pennello's digraph algorithm.
+
+        Computes the smallest sets F with F(x) = base(x) united with F(y)
+        for every y such that x relation y, in time linear in the size of
+        the relation.  Nodes in the same strongly connected component end
+        up sharing one set.
+
+        Parameters:
+
+        nodes: list
+            All nodes of the relation.
+
+        relation: dict
+            Maps a node to the list of nodes it is related to.
+
+        base: dict
+            Maps every node to its initial set.
+
+        Returns: dict
+            Maps every node to its set F(x).
+        """
+
+        infinity = float("inf")
+        depth = {node: 0 for node in nodes}
+        result = {}
+        stack = []
+
+        for start in nodes:
+            if depth[start] != 0:
+                continue
+
+            # iterative depth first traversal: (node, its depth, unvisited relatives)
+            stack.append(start)
+            depth[start] = len(stack)
+            result[start] = set(base[start])
+            work = [(start, len(stack), iter(relation.get(start, ())))]
+
+            while len(work) > 0:
+                node, node_depth, relatives = work[-1]
+                for relative in relatives:
+                    if depth[relative] == 0:
+                        stack.append(relative)
+                        depth[relative] = len(stack)
+                        result[relative] = set(base[relative])
+                        work.append((relative, len(stack), iter(relation.get(relative, ()))))
+                        break
+                    depth[node] = min(depth[node], depth[relative])
+                    result[node] |= result[relative]
+                else:
+                    work.pop()
+
+                    # node is the root of a strongly connected component
+                    if depth[node] == node_depth:
+                        while True:
+                            top = stack.pop()
+                            depth[top] = infinity
+                            result[top] = result[node]
+                            if top == node:
+                                break
+
+                    if len(work) > 0:
+                        parent = work[-1][0]
+                        depth[parent] = min(depth[parent], depth[node])
+                        result[parent] |= result[node]
+
+        return result
+
+    def save_tables(self, cache_file):
+        """ Writes the grammar and parse tables to cache_file.
+
+        The file is written under a temporary name and then renamed, so
+        other processes never see a partially written cache.
+
+        Parameters:
+
+        cache_file: string
+            Name of the cache file to write.
+
+        Returns None.
+        """
+
+        first = [[symbols if type(symbols) == str else list(symbols), sorted(terminals)]
+                 for symbols, terminals in self.first.items()]
+        tables = {
+            "version": CACHE_VERSION,
+            "grammar_hash": self.grammar_hash,
+            "method": self.method,
+            "terminals": sorted(self.terminals),
+            "nonterminals": sorted(self.nonterminals),
+            "rules": [[rule.rule, rule.rule_number, rule.lhs, list(rule.rhs)] for rule in self.rules],
+            "first": first,
+            "follow": {symbol: sorted(terminals) for symbol, terminals in self.follow.items()},
+            "states": [{
+                "kernel": sorted([item.rule.rule_number, item.dot_pos] for item in state.kernel),
+                "action": {symbol: list(action) for symbol, action in state.action.items()},
+                "goto": state.goto,
+            } for state in self.states],
+        }
+
+        directory = os.path.dirname(cache_file) or "."
+        os.makedirs(directory, exist_ok=True)
+        f = tempfile.NamedTemporaryFile("w", dir=directory, delete=False)
+        try:
+            with f:
+                json.dump(tables, f)
+            os.replace(f.name, cache_file)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    def load_tables(self, cache_file):
+        """ Loads the grammar and parse tables written by save_tables.
+
+        Parameters:
+
+        cache_file: string
+            Name of the cache file to read.
+
+        Returns: bool
+            True if the tables were loaded, False if the file is missing,
+            unreadable, from another format version, for another grammar,
+            or does not hold well formed tables (nothing is set then).
+        """
+
+        try:
+            with open(cache_file) as f:
+                tables = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if type(tables) != dict or tables.get("version") != CACHE_VERSION \
+                or tables.get("grammar_hash") != self.grammar_hash or tables.get("method") != self.method:
+            return False
+
+        try:
+            terminals, nonterminals, rules, item_table, first, follow, states = self.read_tables(tables)
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+            return False
+
+        self.terminals = terminals
+        self.nonterminals = nonterminals
+        self.rules = rules
+        self.dummy_rule = self.rules[0]
+        self.rules_by_lhs = {}
+        for rule in self.rules:
+            self.rules_by_lhs.setdefault(rule.lhs, []).append(rule)
+        self.first = first
+        self.follow = follow
+        self.states = states
+        self.item_table = item_table
+        self.closure_templates = self.compute_closure_templates()
+        return True
+
+    def read_tables(self, tables):
+        """ Makes the grammar and parse tables out of the contents of a
+        cache file, checking that they are complete and consistent: every
+        symbol, rule number and state number they use must exist.
+
+        Returns: tuple
+            (terminals, nonterminals, rules, item_table, first, follow, states),
+            where item_table is make_item_table of rules
+
+        Raises KeyError, IndexError, TypeError or ValueError if the tables
+        are not well formed.
+        """
+
+        def strings(values):
+            values = list(values)
+            if not all(type(value) == str for value in values):
+                raise TypeError("expected strings")
+            return values
+
+        def number(value, limit):
+            if type(value) != int or not 0 <= value < limit:
+                raise ValueError(f"bad number {value!r}")
+            return value
+
+        terminals = set(strings(tables["terminals"]))
+        nonterminals = set(strings(tables["nonterminals"]))
+        if self.end_of_input not in terminals or len(terminals & nonterminals) > 0:
+            raise ValueError("bad symbols")
+        symbols = terminals | nonterminals | {self.epsilon}
+
+        rules = []
+        for rule, rule_number, lhs, rhs in tables["rules"]:
+            rhs = tuple(strings(rhs))
+            if type(rule) != str or rule_number != len(rules) or lhs not in nonterminals \
+                    or len(rhs) == 0 or not set(rhs) <= symbols:
+                raise ValueError(f"bad rule {rule!r}")
+            rules.append(Rule(rule, rule_number, lhs, rhs))
+        if len(rules) == 0:
+            raise ValueError("no rules")
+        item_table = self.make_item_table(rules)
+
+        first = {}
+        for key, values in tables["first"]:
+            first[key if type(key) == str else tuple(strings(key))] = set(strings(values))
+        follow = {symbol: set(strings(values)) for symbol, values in tables["follow"].items()}
+
+        states = []
+        num_states = len(tables["states"])
+        for table in tables["states"]:
+            kernel = set()
+            for rule_number, dot_pos in table["kernel"]:
+                rule = rules[number(rule_number, len(rules))]
+                kernel.add(item_table[rule.rule_number][number(dot_pos, len(rule.rhs) + 1)])
+            state = State(kernel)
+            state.action = {}
+            for terminal, action in table["action"].items():
+                action = tuple(action)
+                if terminal not in terminals:
+                    raise ValueError(f"bad terminal {terminal!r}")
+                if action[0] == "shift" and len(action) == 2:
+                    number(action[1], num_states)
+                elif action[0] == "reduce" and len(action) == 2:
+                    number(action[1], len(rules))
+                elif action != (self.accept_action,):
+                    raise ValueError(f"bad action {action!r}")
+                state.action[terminal] = action
+            state.goto = {}
+            for nonterminal, target in table["goto"].items():
+                if nonterminal not in nonterminals:
+                    raise ValueError(f"bad nonterminal {nonterminal!r}")
+                state.goto[nonterminal] = number(target, num_states)
+            states.append(state)
+        if num_states == 0:
+            raise ValueError("no states")
+
+        return (terminals, nonterminals, rules, item_table, first, follow, states)
+
+    def make_int_tables(self):
+        """ Builds integer versions of the action and goto dictionaries of
+        the states, for the parse loop.
+
+        Terminals are numbered 0, 1, ... in sorted order (terminal_codes),
+        and one more code, invalid_code, stands for token types that are
+        not terminals of the grammar.  Nonterminals are numbered the same
+        way (nonterminal_codes).  The lexer is given the terminal codes, so
+        it hands the parser integer token codes.
+
+        An action is encoded as an int:
+            0: error
+            n > 0: shift to state n - 1
+            n < 0: reduce by rule -n - 1 (-1, reducing by the dummy rule, is accept)
+
+        The action of state s on terminal code t is looked up as
+            i = action_base[s] + t
+            action_value[i] if action_check[i] == s else action_default[s]
+        and the goto of state s on nonterminal code n as
+            i = goto_base[n] + s
+            goto_value[i] if goto_check[i] == n else goto_default[n]
+
+        Epsilon rules are reduced on their lookaheads, like any other rule.
+
+        If self.compress is True, the rows are packed into the value and
+        check arrays by row displacement (see pack_rows), and only entries
+        that differ from the row's default are stored.  The default action
+        of a state is then its most common reduction by a rule with a
+        non-empty rhs (so a terminal that is an error in the state may
+        reduce first), and a nonterminal's default goto is its most common
+        target.  Otherwise every row is stored in full, one after the
+        other, with error as the default.
+
+        default_reductions[s] is the action of state s if it is the same
+        reduction, by a rule with a non-empty rhs, for every terminal with
+        an action, so the parser can reduce without reading the next token,
+        and 0 otherwise.
+
+        A reduction taken whatever the next token is never pushes more
+        states than it pops, and the parser still shifts or reports an
+        error after a finite number of them: reductions that came back to
+        the same stack without a shift would be a derivation of a string
+        from itself, which makes the grammar ambiguous, so it would have
+        conflicts.
+
+        symbol_names lists every grammar symbol: the terminals in code
+        order, then the nonterminals in code order (nonterminal code n is
+        symbol len(terminal_codes) + n), then epsilon; symbol_codes maps
+        each name to its index.  Parse trees store symbols by these numbers.
+
+        rule_lhs and rule_length give the lhs code and the number of rhs
+        symbols of each rule (0 for an epsilon rule), and unit_rules[r] is
+        1 if rule r is a unit rule (its rhs is a single nonterminal).
+        unit_states[s] is 1 if state s has an action that reduces by a
+        unit rule and self.bypass_units is True, so the parser follows
+        unit reductions from s without using its stack.
+
+        Returns None.
+        """
+
+        self.terminal_codes = {terminal: code for code, terminal in enumerate(sorted(self.terminals))}
+        self.nonterminal_codes = {nonterminal: code for code, nonterminal in enumerate(sorted(self.nonterminals))}
+        self.invalid_code = len(self.terminal_codes)
+        self.end_code = self.terminal_codes[self.end_of_input]
+        self.symbol_names = (sorted(self.terminal_codes, key=self.terminal_codes.get)
+                             + sorted(self.nonterminal_codes, key=self.nonterminal_codes.get) + [self.epsilon])
+        self.symbol_codes = {symbol: code for code, symbol in enumerate(self.symbol_names)}
+        action_width = len(self.terminal_codes) + 1
+
+        action_rows = []
+        for state in self.states:
+            row = {}
+            for terminal, action in state.action.items():
+                if action[0] == "shift":
+                    row[self.terminal_codes[terminal]] = action[1] + 1
+                elif action[0] == "reduce":
+                    row[self.terminal_codes[terminal]] = -action[1] - 1
+                else:
+                    row[self.terminal_codes[terminal]] = -1
+            action_rows.append(row)
+
+        goto_rows = [{} for _ in self.nonterminal_codes]
+        for i, state in enumerate(self.states):
+            for nonterminal, target in state.goto.items():
+                goto_rows[self.nonterminal_codes[nonterminal]][i] = target
+
+        # The reductions that may be taken without looking at the next token
+        def default_reduction(action):
+            return action < -1 and self.rules[-action - 1].rhs[0] != self.epsilon
+
+        self.action_default = array("i", [0] * len(self.states))
+        self.default_reductions = array("i", [0] * len(self.states))
+        for i, row in enumerate(action_rows):
+            if len(row) > 0 and len(set(row.values())) == 1:
+                action = next(iter(row.values()))
+                if default_reduction(action):
+                    self.default_reductions[i] = action
+
+        if self.compress:
+            for i, row in enumerate(action_rows):
+                self.action_default[i] = self.most_common(
+                    [action for action in row.values() if default_reduction(action)], 0)
+            self.goto_default = array("i", [self.most_common(list(row.values()), -1) for row in goto_rows])
+
+            self.action_base, self.action_check, self.action_value = self.pack_rows(
+                [{code: action for code, action in row.items() if action != default}
+                 for row, default in zip(action_rows, self.action_default)], action_width)
+            self.goto_base, self.goto_check, self.goto_value = self.pack_rows(
+                [{i: target for i, target in row.items() if target != default}
+                 for row, default in zip(goto_rows, self.goto_default)], len(self.states))
+        else:
+            self.action_base, self.action_check, self.action_value = self.dense_rows(
+                action_rows, action_width, self.action_default)
+            self.goto_default = array("i", [-1] * len(goto_rows))
+            self.goto_base, self.goto_check, self.goto_value = self.dense_rows(
+                goto_rows, len(self.states), self.goto_default)
+
+        self.rule_lhs = array("i", [self.nonterminal_codes[rule.lhs] for rule in self.rules])
+        self.rule_length = array("i", [0 if rule.rhs[0] == self.epsilon else len(rule.rhs) for rule in self.rules])
+        self.unit_rules = bytes(len(rule.rhs) == 1 and rule.rhs[0] in self.nonterminals for rule in self.rules)
+
+        unit_states = bytearray(len(self.states))
+        if self.bypass_units:
+            for i, row in enumerate(action_rows):
+                for action in list(row.values()) + [self.action_default[i]]:
+                    if action < -1 and self.unit_rules[-action - 1]:
+                        unit_states[i] = 1
+        self.unit_states = bytes(unit_states)
+
+        self.lexer.set_token_codes({token_type: self.terminal_codes.get(token_type, self.invalid_code)
+                                    for token_type in self.lexer.token_types})
+
+    def most_common(self, values, empty):
+        """ Returns the value that occurs most often in the list values (the
+        smallest one if there is a tie), or empty if values is empty.
+        """
+
+        counts = {}
+        for value in values:
+            counts[value] = counts.get(value, 0) + 1
+        return min(counts, key=lambda value: (-counts[value], value), default=empty)
+
+    def dense_rows(self, rows, width, defaults):
+        """ Lays out rows in full, one after the other, in the format of pack_rows.
+
+        Parameters:
+
+        rows: list of dict
+            rows[r][column] is the value of the entry, for columns 0 to
+            width - 1.
+
+        width: int
+            Number of columns of a row.
+
+        defaults: array of int
+            defaults[r] is stored for the columns missing from rows[r].
+
+        Returns: (base, check, value), see pack_rows.
+        """
+
+        base = array("i", range(0, len(rows) * width, width))
+        check = array("i")
+        value = array("i")
+        for r, row in enumerate(rows):
+            check.extend([r] * width)
+            value.extend([row.get(column, defaults[r]) for column in range(width)])
+        return base, check, value
+
+    def pack_rows(self, rows, width):
+        """ Packs sparse rows into one array by row displacement.
+
+        Each row r is given an offset base[r] such that no two rows use
+        the same position for their entries, so its entry in column c is
+        at value[base[r] + c], and check[base[r] + c] == r tells that the
+        position belongs to row r.  Positions that do not belong to the
+        row hold its default, which is looked up separately.  Rows are
+        placed from the fullest to the emptiest, each at the first offset
+        where it fits (first fit).
+
+        Parameters:
+
+        rows: list of dict
+            rows[r][column] is the value of the entry, for the columns of
+            row r that are not its default (0 to width - 1).
+
+        width: int
+            Number of columns of a row.  The arrays are padded so that
+            base[r] + column is a valid position for every row and column.
+
+        Returns: (base, check, value)
+            Three arrays of int.  check is -1 at unused positions.
+        """
+
+        base = array("i", [0] * len(rows))
+        check = array("i")
+        value = array("i")
+        first_free = 0
+
+        for r in sorted(range(len(rows)), key=lambda r: (-len(rows[r]), r)):
+            columns = sorted(rows[r])
+            if len(columns) == 0:
+                continue
+
+            offset = max(0, first_free - columns[0])
+            while True:
+                for column in columns:
+                    position = offset + column
+                    if position < len(check) and check[position] != -1:
+                        break
+                else:
+                    break
+                offset += 1
+
+            end = offset + columns[-1] + 1
+            if end > len(check):
+                check.extend([-1] * (end - len(check)))
+                value.extend([0] * (end - len(value)))
+            for column in columns:
+                check[offset + column] = r
+                value[offset + column] = rows[r][column]
+            base[r] = offset
+
+            while first_free < len(check) and check[first_free] != -1:
+                first_free += 1
+
+        # padding so every lookup stays inside the arrays
+        size = max(base, default=0) + width
+        if size > len(check):
+            check.extend([-1] * (size - len(check)))
+            value.extend([0] * (size - len(value)))
+        return base, check, value
+
+    def table_bytes(self):
+        """ Returns the size in bytes of the parse tables: (dense, actual).
+
+        dense is the size of plain action and goto arrays with one int per
+        state and symbol, and actual is the size of the arrays built by
+        make_int_tables (packed if self.compress is True).
+        """
+
+        dense = len(self.states) * (self.invalid_code + 1 + len(self.nonterminal_codes)) * 4
+        actual = sum(len(table) * table.itemsize for table in (
+            self.action_base, self.action_check, self.action_value, self.action_default,
+            self.goto_base, self.goto_check, self.goto_value, self.goto_default))
+        return dense, actual
+
     def goto(self, state, symbol):
         """ Gets the set of items to transition to from a state in the LR automaton.
 
@@ -521,32 +1200,82 @@ class Parser:
         """
 
         goto_items = set()
-        for item in state.items:
+        for item in self.items_closure(set(state.kernel)):
             if item.dot_pos < len(item.rule.rhs) and symbol == item.rule.rhs[item.dot_pos]:
-                goto_items.add(Item(item.rule, item.dot_pos + 1))
+                goto_items.add(self.make_item(item.rule, item.dot_pos + 1))
         goto_items = self.items_closure(goto_items)
         return goto_items
     
-    def get_state_index(self, items, states):
-        """ Get index of state that contains the specified items.
-        
+    def make_item_table(self, rules):
+        """ Makes the Item of every (rule, dot_pos) pair of rules.
+
+        Returns: tuple
+            item_table[rule_number][dot_pos] is the Item.
+        """
+
+        return tuple(tuple(Item(rule, dot_pos) for dot_pos in range(len(rule.rhs) + 1)) for rule in rules)
+
+    def make_item(self, rule, dot_pos):
+        """ Returns the Item for rule and dot_pos.
+
+        Parameters:
+
+        rule: Rule
+            The rule part of the Item.
+
+        dot_pos: int
+            Where the dot is in the rule.
+
+        Returns: Item
+            The one Item object for (rule.rule_number, dot_pos), from
+            item_table, which is made with the rules and never changes.
+        """
+
+        return self.item_table[rule.rule_number][dot_pos]
+
+    def kernel_key(self, items):
+        """ Returns a hashable key for a set of kernel items.
+
         Parameters:
 
         items: set of Item
-            The set of items to search for in the state list.
+            The kernel items of a state.
 
-        states: list of State
-            the list of states to search for the set of items.
+        Returns: frozenset of (int, int)
+            The (rule_number, dot_pos) pairs of the items.
+        """
+
+        return frozenset((item.rule.rule_number, item.dot_pos) for item in items)
+
+    def compute_closure_templates(self):
+        """ Computes the closure template of every nonterminal.
+
+        The template of a nonterminal X is the set of items (all with the
+        dot at position 0) that closure adds to a state when the dot is
+        in front of X: the rules for X, and recursively the rules for
+        any nonterminal that begins one of those rules.
 
-        Returns: int or None
-            Returns the index of the state belonging to the set of Items,
-            or None if the set of items not found in the list of state.
+        Returns: dict
+            key is a nonterminal, value is a frozenset of Item.
         """
 
-        for i, state in enumerate(states):
-            if items == state.items:
-                return i
-        return None
+        # The interned item of each rule with the dot at position 0
+        initial_items = [self.make_item(rule, 0) for rule in self.rules]
+
+        templates = {}
+        for nonterminal in sorted(self.nonterminals):
+            seen = {nonterminal}
+            stack = [nonterminal]
+            items = set()
+            while len(stack) > 0:
+                for rule in self.rules_by_lhs.get(stack.pop(), []):
+                    items.add(initial_items[rule.rule_number])
+                    symbol = rule.rhs[0]
+                    if symbol in self.nonterminals and symbol not in seen:
+                        seen.add(symbol)
+                        stack.append(symbol)
+            templates[nonterminal] = frozenset(items)
+        return templates
 
     def items_closure(self, items):
         """ Updates set of items to contain the closure of itself.
@@ -560,34 +1289,122 @@ class Parser:
             Returns the closure of the set of items.
         """
 
-        # Keep adding new items until no more items are added.
-        while True:
-            new_items = set()
-            for item in items:
-                rule = item.rule
-                rhs = rule.rhs
-                dot_pos = item.dot_pos
-                if dot_pos < len(rhs) and rhs[dot_pos] in self.nonterminals:
-                    nonterminal = rhs[dot_pos]
-                    for rule in self.rules_by_lhs[nonterminal]:
-                        item = Item(rule, 0)
-                        if item not in items:
-                            new_items.add(item)
-            if not new_items:
-                break
-            else:
-                items.update(new_items)
+        # Each nonterminal after a dot adds its whole template at once.
+        added = set()
+        for item in list(items):
+            rhs = item.rule.rhs
+            if item.dot_pos < len(rhs) and rhs[item.dot_pos] in self.nonterminals:
+                added.add(rhs[item.dot_pos])
+        for nonterminal in added:
+            items.update(self.closure_templates[nonterminal])
         return items
-    
-    def parse(self):
+
+class Parser:
+    """ Manages parsing of an input file, given the grammar
+        specification, and the specification of the terminals 
+        of the grammar.
+
+        The compiled tables are kept in a Grammar; the Parser itself only
+        holds what one parse needs (its lexer for the input).
+
+        Threads can share a Grammar and parse at the same time, each with
+        its own Parser (from_grammar, or Grammar.parse): a parse keeps its
+        stack and token position to itself and only reads the Grammar.  A
+        Parser parses its input once and is not shared between threads.
+    """
+
+    def __init__(self, lexer_filename, grammar_filename, source_filename, cache_dir=None, method="slr",
+                 compress=True, bypass_units=True):
+        """ Initializes the Parser object.
+        
+        Parameters:
+        lexer_filename: string
+            Name of file containing the specifications of the terminals
+            of the grammar.  Terminals are specified by regular expressions.
+            (Format of this file is specified in pa4 problem statement.)
+
+        grammar_filename: string
+            Name of file containing specification of the grammar.  (Format
+            of this file is specified in pa5 problem statement.)
+
+        source_filename: string
+            Name of the file containing the input to the parser.
+
+        cache_dir: string or None
+            Directory for cached compiled tables (see Grammar).
+
+        method: string
+            "slr" or "lalr" parse tables (see Grammar).
+
+        compress: bool
+            Whether the parse tables are packed (see Grammar).
+
+        bypass_units: bool
+            Whether chains of unit reductions bypass the stack (see Grammar).
+        """
+
+        try:
+            self.use_grammar(Grammar(lexer_filename, grammar_filename, cache_dir, method, compress,
+                                     bypass_units), source_filename)
+        except InvalidToken:
+            print(f"Invalid token while processing input file {source_filename}")
+
+    @classmethod
+    def from_grammar(cls, grammar, source_filename=None, text=None, buffer=None):
+        """ Returns a Parser for source_filename (or the string text, or the
+        bytes-like buffer) that uses an already compiled Grammar, so nothing
+        is rebuilt.
+        """
+
+        parser = cls.__new__(cls)
+        parser.use_grammar(grammar, source_filename, text, buffer)
+        return parser
+
+    def use_grammar(self, grammar, source_filename=None, text=None, buffer=None):
+        """ Sets up the Parser to parse source_filename (or the string text,
+        or the bytes-like buffer, see Lex.for_buffer) with grammar.  The
+        grammar's tables are also available as attributes of the Parser
+        (terminals, rules, states, ...).
+        """
+
+        self.grammar = grammar
+        if buffer != None:
+            self.lexer = grammar.lexer.for_buffer(buffer)
+        else:
+            self.lexer = grammar.lexer.for_source(source_filename, text)
+
+        self.end_of_input = grammar.end_of_input
+        self.dummy_start_symbol = grammar.dummy_start_symbol
+        self.start_state_num = grammar.start_state_num
+        self.epsilon = grammar.epsilon
+        self.accept_action = grammar.accept_action
+        self.terminals = grammar.terminals
+        self.nonterminals = grammar.nonterminals
+        self.rules = grammar.rules
+        self.rules_by_lhs = grammar.rules_by_lhs
+        self.first = grammar.first
+        self.follow = grammar.follow
+        self.states = grammar.states
+
+    def parse(self, compact=False):
         """ Parse the source file.
 
+        Parameters:
+
+        compact: bool
+            If True, the nodes of unit rules (rules like E : T) are left out
+            of the parse tree: the node of T takes the place of the node of E.
+
         Returns: list
             Returns the parse tree for the source file, returned as a list generated
             by visiting the nodes of the parse tree in depth-first, pre-order fashion.
             Each node of the parse tree is a string containing a grammar symbol - nonterminals for 
             interior nodes, and terminals (or eps) for leaf nodes.
 
+        After the parse, self.reductions is the number of reductions that
+        went through the stack, and self.unit_reductions the number of unit
+        reductions that bypassed it (see Grammar).
+
         Exceptions raised:
 
         lex.InvalidToken: raised by the next_token method of the Lex class
@@ -599,86 +1416,356 @@ class Parser:
         SourceFileSyntaxError: raised by the parse method of the Parser class
         if the method detects that the next input token is valid for the grammar.
         """
-        
-        #Create states
-        states = self.compute_parse_table_states()
 
-        #Initialize stack
-        stack = [(states[0], None)]
+        return list(self.parse_tree(compact).preorder())
 
-        next_input = self.lexer.next_token()
-        while True:
-            if next_input[0] not in stack[-1][0].action.keys():
-                #Flag is to break out of loop, if we dont have an epsilon transition within the state that has no actions for the next input
-                flag = 1
-                for item in stack[-1][0].items:
-                    if item.rule.rhs[0] == "eps":
-                        flag = 0
-                        temp = Node("eps")
-                        node = Node(item.rule.lhs)
-                        node.children.append(temp)
-                        stack.append((states[stack[-1][0].goto[item.rule.lhs]], node)) 
-                        break
-                if flag == 1:
-                    raise SourceFileSyntaxError
+    def parse_tree(self, compact=False):
+        """ Parse the source file like parse, but return the parse tree itself.
+
+        Returns: Node
+            The root of the parse tree.
+        """
 
+        # The nodes of the subtrees not yet reduced, built from the events
+        nodes = []
+        for event in self.events(compact):
+            if event[0] == "token":
+                nodes.append(Node(event[1]))
             else:
-                action = stack[-1][0].action[next_input[0]]
+                node = Node(event[1])
+                count = event[2]
+                node.children = nodes[-count:]
+                del nodes[-count:]
+                nodes.append(node)
 
-                if action[0] == "shift":
-                    #Create a new node for the shifted state and add it to stack
-                    node = Node(next_input[1])
-                    stack.append((states[action[1]], node))
-                    try:
-                        next_input = self.lexer.next_token()
-                    except EOFError:
-                        next_input = ('END_OF_INPUT', 'end')
+        return nodes.pop()
 
-                elif action[0] == "reduce":
-                    rule = self.rules[action[1]]
+    def parse_array(self, compact=False):
+        """ Parse the source file like parse, but store the parse tree in an
+        ArrayTree instead of one Node object per node.  The text of the
+        tokens is not copied out of the source: the tree keeps the source
+        (see ArrayTree) and the span of each token in it.
 
-                    # pop len(rhs) of the rule states off the stack and add them to the children of the new node
-                    node = Node(rule.lhs)
-                    for _ in range(len(rule.rhs)):
-                        node.children.append(stack.pop())
+        Returns: ArrayTree
+        """
 
-                    # goto the correct state based on goto dict and add node to stack
-                    where_to_go = stack[-1][0].goto[rule.lhs]
-                    stack.append((states[where_to_go], node))
-            
-                elif action[0] == self.accept_action:
+        tree = ArrayTree(self.grammar.symbol_names)
+        symbol_codes = self.grammar.symbol_codes
+        symbols = tree.symbols
+        starts = tree.starts
+        ends = tree.ends
+        parents = tree.parents
+        first_children = tree.first_children
+        next_siblings = tree.next_siblings
+        # The node numbers of the subtrees not yet reduced
+        roots = array("i")
+        if self.lexer.buffer != None:
+            tree.source = self.lexer.buffer
+        else:
+            chunks = self.lexer.source_chunks = []
+        for event in self.events(compact, text=False):
+            node = len(symbols)
+            parents.append(-1)
+            next_siblings.append(-1)
+            if event[0] == "token":
+                symbols.append(symbol_codes[event[2]])
+                starts.append(event[3])
+                ends.append(event[4])
+                first_children.append(-1)
+            else:
+                symbols.append(symbol_codes[event[1]])
+                starts.append(-1)
+                ends.append(-1)
+                count = event[2]
+                first = len(roots) - count
+                first_children.append(roots[first])
+                prev = -1
+                for child in roots[first:]:
+                    parents[child] = node
+                    if prev != -1:
+                        next_siblings[prev] = child
+                    prev = child
+                del roots[first:]
+            roots.append(node)
+
+        if self.lexer.buffer == None:
+            tree.source = "".join(chunks)
+        tree.root = roots[0]
+        return tree
+
+    def events(self, compact=False, text=True):
+        """ Parse the source file, generating the parse as a stream of events
+        instead of building a tree.
+
+        The events come in the order the LR driver performs them, which is
+        the postorder of the parse tree:
+
+        ("token", value, terminal, start, end)
+            A leaf: a shifted token, with its text (value), its terminal,
+            and its offsets in the source (see Lex.spans), or "eps" (as
+            both value and terminal, with offsets -1) for the empty rhs of
+            an epsilon rule.
+
+        ("reduce", lhs, count, rule_number)
+            An interior node for the nonterminal lhs, by rule rule_number,
+            whose children are the last count leaves and nodes that are not
+            yet children of another node.
+
+        A consumer can fold the events with a stack (this is what parse
+        does), or handle each one as it comes, so only the driver's state
+        stack is kept in memory.  Tokens are read from the lexer as the
+        events are generated.
+
+        Parameters:
+
+        compact: bool
+            If True, unit rules generate no events (see parse).
+
+        text: bool
+            If False, the value of a token is None, and its text is not
+            copied out of the source.
+
+        Exceptions raised: as for parse.
+        """
+
+        grammar = self.grammar
+        action_base = grammar.action_base
+        action_check = grammar.action_check
+        action_value = grammar.action_value
+        action_default = grammar.action_default
+        default_reductions = grammar.default_reductions
+        goto_base = grammar.goto_base
+        goto_check = grammar.goto_check
+        goto_value = grammar.goto_value
+        goto_default = grammar.goto_default
+        rule_lhs = grammar.rule_lhs
+        rule_length = grammar.rule_length
+        unit_rules = grammar.unit_rules
+        unit_states = grammar.unit_states
+        rules = self.rules
+        token_codes = self.lexer.token_codes
+        token_text = self.lexer.token_text
+        end_code = grammar.end_code
+        epsilon = self.epsilon
+        spans = self.lexer.spans()
+        reductions = 0
+        unit_reductions = 0
+
+        #Initialize stack of states
+        states = [self.start_state_num]
+
+        # The source file is closed however the parse ends
+        try:
+            # The next token is only read when an action depends on it; code is -1 until then
+            code = -1
+            while True:
+                state = states[-1]
+                action = default_reductions[state]
+
+                if action == 0:
+                    if code == -1:
+                        span = next(spans, None)
+                        if span == None:
+                            code = end_code
+                        elif span == "INVALID":
+                            raise InvalidToken
+                        else:
+                            code = token_codes[span[0]]
+                    i = action_base[state] + code
+                    action = action_value[i] if action_check[i] == state else action_default[state]
+
+                if action > 0:
+                    #Shift: a new leaf for the shifted state
+                    states.append(action - 1)
+                    if code == end_code:
+                        yield ("token", 'end', self.end_of_input, -1, -1)
+                    else:
+                        yield ("token", token_text(span[1], span[2]) if text else None, span[0], span[1], span[2])
+                    code = -1
+
+                elif action < -1:
+                    rule_number = -action - 1
+                    reductions += 1
+
+                    # pop the states of the rhs off the stack, their nodes become the children of the new node
+                    length = rule_length[rule_number]
+                    if compact and unit_rules[rule_number]:
+                        states.pop()
+                    elif length > 0:
+                        del states[-length:]
+                        yield ("reduce", rules[rule_number].lhs, length, rule_number)
+                    else:
+                        yield ("token", epsilon, epsilon, -1, -1)
+                        yield ("reduce", rules[rule_number].lhs, 1, rule_number)
+
+                    # goto the correct state based on the goto table
+                    state = states[-1]
+                    lhs = rule_lhs[rule_number]
+                    i = goto_base[lhs] + state
+                    target = goto_value[i] if goto_check[i] == lhs else goto_default[lhs]
+
+                    # A unit reduction from target pops target and goes to from state on
+                    # the unit rule's lhs, so chains of them are followed without the stack.
+                    while unit_states[target]:
+                        action = default_reductions[target]
+                        if action == 0:
+                            if code == -1:
+                                span = next(spans, None)
+                                if span == None:
+                                    code = end_code
+                                elif span == "INVALID":
+                                    raise InvalidToken
+                                else:
+                                    code = token_codes[span[0]]
+                            i = action_base[target] + code
+                            action = action_value[i] if action_check[i] == target else action_default[target]
+                        if action >= -1 or not unit_rules[-action - 1]:
+                            break
+
+                        rule_number = -action - 1
+                        unit_reductions += 1
+                        if not compact:
+                            yield ("reduce", rules[rule_number].lhs, 1, rule_number)
+                        lhs = rule_lhs[rule_number]
+                        i = goto_base[lhs] + state
+                        target = goto_value[i] if goto_check[i] == lhs else goto_default[lhs]
+
+                    # add the state to the stack
+                    states.append(target)
+
+                elif action == -1:
                     #Accepts!
                     break
-                    
-        root = stack.pop()
-        ret = []
-        
-        #Preorder traversal code
-        def preorder_trav(root):
-            if not root:
-                return
-
-            if type(root) == Node:
-                ret.append(root.item)
-                for child in reversed(root.children):
-                    preorder_trav(child)
-            else:
-                ret.append(root[1].item)
 
-                for child in reversed(root[1].children):
-                    preorder_trav(child)
+                else:
+                    raise SourceFileSyntaxError
+        finally:
+            self.lexer.close()
 
-        preorder_trav(root)
-        return ret
+        self.reductions = reductions
+        self.unit_reductions = unit_reductions
 
 class Node:
     """ 
     Node class to hold state and item for parsing as well as children for tree
     """
+
+    __slots__ = ("item", "children")
+
     def __init__(self, item):
         self.item = item
         self.children = []
 
+    def preorder(self):
+        """ Generates the items of the tree rooted at this node in depth-first,
+        pre-order fashion.  The traversal keeps its own stack of the nodes
+        still to visit, so it works on trees of any depth.
+        """
+
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node.item
+            stack.extend(reversed(node.children))
+
+class ArrayTree:
+    """ A parse tree stored as parallel arrays instead of Node objects.
+
+    Nodes are numbered in the order the parser completes them (postorder),
+    so the root is the last node.  For node n:
+
+    symbols[n]: index in symbol_names of the node's grammar symbol (the
+    nonterminal of an interior node, the terminal of a leaf, or eps)
+    starts[n], ends[n]: the offsets of a token's text in source, or -1
+    for an interior node or eps
+    parents[n]: the parent node, or -1 for the root
+    first_children[n]: the first child, or -1 for a leaf
+    next_siblings[n]: the next child of the parent, or -1 for the last
+
+    source is the text that was parsed (a string, or a bytes-like buffer
+    where each byte is one character), so the text of each token is
+    stored once, in place, and only sliced out when it is asked for.
+    """
+
+    def __init__(self, symbol_names):
+        self.symbol_names = symbol_names
+        self.source = ""
+        self.symbols = array("i")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.parents = array("i")
+        self.first_children = array("i")
+        self.next_siblings = array("i")
+        self.root = -1
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def item(self, node):
+        """ Returns the item of node, as in the trees of parse: its text for
+        a token, and its symbol name otherwise.
+        """
+
+        start = self.starts[node]
+        if start == -1:
+            return self.symbol_names[self.symbols[node]]
+        return self.text(start, self.ends[node])
+
+    def symbol(self, node):
+        return self.symbol_names[self.symbols[node]]
+
+    def text(self, start, end):
+        """ Returns source[start:end] as a string. """
+
+        if type(self.source) == str:
+            return self.source[start:end]
+        return str(self.source[start:end], "latin-1")
+
+    def parent(self, node):
+        return self.parents[node]
+
+    def first_child(self, node):
+        return self.first_children[node]
+
+    def next_sibling(self, node):
+        return self.next_siblings[node]
+
+    def children(self, node):
+        """ Generates the children of node, in order. """
+
+        child = self.first_children[node]
+        while child != -1:
+            yield child
+            child = self.next_siblings[child]
+
+    def preorder(self, node=None):
+        """ Generates the items of the subtree rooted at node (by default the
+        whole tree) in depth-first, pre-order fashion, like Node.preorder.
+        """
+
+        if node == None:
+            node = self.root
+        item = self.item
+        first_children = self.first_children
+        next_siblings = self.next_siblings
+
+        # Each stack entry is the next node to visit at one depth; the
+        # sibling of the starting node is not part of the subtree
+        yield item(node)
+        stack = []
+        child = first_children[node]
+        while True:
+            if child == -1:
+                if len(stack) == 0:
+                    return
+                child = stack.pop()
+                continue
+            yield item(child)
+            sibling = next_siblings[child]
+            if sibling != -1:
+                stack.append(sibling)
+            child = first_children[child]
+
 if __name__ == "__main__":
     lexer_filename = "tokens1.txt"
     grammar_filename = "grammar1.txt"
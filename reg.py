@@ -208,6 +208,10 @@ class RegEx:
 		self.alphabet_list = []
 		self.expr = ""
 
+		# how get_dfa builds its DFA: "nfa" (Thompson NFA, then subset
+		# construction) or "followpos" (directly from the syntax tree)
+		self.construction = "nfa"
+
 		if filename != None:
 			file = open(filename)
 
@@ -462,19 +466,132 @@ class RegEx:
 
 		return dfa.simulate(str)
 
+	def get_nfa(self):
+		"""
+		Returns an NFA equivalent to the "self" regular expression,
+		including the "e" regex that only matches the empty string.
+		"""
+
+		#Handles the "e" regex on 3 and 20
+		if self.expr != "e":
+			return self.to_nfa()
+		return EmptyNode(self.expr).to_nfa(self.alphabet + "e")
+
 	def get_dfa(self):
 		"""
-		Returns the dfa for the given expr
+		Returns a DFA equivalent to the "self" regular expression.
+		The DFA can be simulated any number of times without
+		rebuilding the syntax tree and NFA.
+		"""
+
+		if self.construction == "followpos":
+			return self.to_dfa_direct()
+		return self.get_nfa().to_DFA()
+
+	def to_dfa_direct(self):
+		"""
+		Returns a DFA equivalent to the "self" regular expression, built
+		straight from the syntax tree with the followpos construction
+		(no NFA is created).  Each leaf of the tree is a position; a DFA
+		state is the set of positions that can match the next character.
 		"""
 
 		#Handles the "e" regex on 3 and 20
 		if self.expr != "e":
-			nfa = self.to_nfa()
+			syntax_tree = self.to_syntax_tree()
 		else:
-			if str != '':
-				return None
+			syntax_tree = EmptyNode(self.expr)
+
+		# symbols[p] is the alphabet index matched by position p
+		symbols = []
+		followpos = []
+		nullable = {}
+		firstpos = {}
+		lastpos = {}
+
+		# post order traversal without recursion, left child first
+		stack = [(syntax_tree, False)]
+		while len(stack) != 0:
+			root, visited = stack.pop()
+
+			if not visited:
+				stack.append((root, True))
+				if isinstance(root, (UnionNode, ConcatNode)):
+					stack.append((root.right, False))
+				if isinstance(root, (StarNode, UnionNode, ConcatNode)):
+					stack.append((root.left, False))
+				continue
+
+			key = id(root)
+			if isinstance(root, LeafNode):
+				symbol = root.symbol[1] if root.symbol[0] == "\\" else root.symbol
+				symbols.append(self.alphabet.index(symbol))
+				followpos.append(set())
+				nullable[key] = False
+				firstpos[key] = lastpos[key] = frozenset([len(symbols) - 1])
+
+			elif isinstance(root, EmptyNode):
+				nullable[key] = True
+				firstpos[key] = lastpos[key] = frozenset()
+
+			elif isinstance(root, StarNode):
+				left = id(root.left)
+				nullable[key] = True
+				firstpos[key] = firstpos[left]
+				lastpos[key] = lastpos[left]
+				for p in lastpos[left]:
+					followpos[p] |= firstpos[left]
+
+			elif isinstance(root, UnionNode):
+				left, right = id(root.left), id(root.right)
+				nullable[key] = nullable[left] or nullable[right]
+				firstpos[key] = firstpos[left] | firstpos[right]
+				lastpos[key] = lastpos[left] | lastpos[right]
+
 			else:
-				return nfa.to_DFA()
+				left, right = id(root.left), id(root.right)
+				nullable[key] = nullable[left] and nullable[right]
+				firstpos[key] = firstpos[left] | firstpos[right] if nullable[left] else firstpos[left]
+				lastpos[key] = lastpos[left] | lastpos[right] if nullable[right] else lastpos[right]
+				for p in lastpos[left]:
+					followpos[p] |= firstpos[right]
+
+		# concatenating an end marker position; states holding it accept
+		root = id(syntax_tree)
+		end = len(symbols)
+		for p in lastpos[root]:
+			followpos[p].add(end)
+		start = firstpos[root] | {end} if nullable[root] else firstpos[root]
+
+		d = DFA()
+		d.alphabet = self.alphabet
+		d.make_alphabet_list()
+
+		index = {start: 1}
+		new_states = [start]
+		i = 0
+		while i < len(new_states):
+			moves = {}
+			for p in new_states[i]:
+				if p != end:
+					moves.setdefault(symbols[p], set()).update(followpos[p])
+
+			d.transitions[i + 1] = [None] * len(self.alphabet)
+			for j in range(len(self.alphabet)):
+				to_state = frozenset(moves.get(j, ()))
+				if to_state not in index:
+					new_states.append(to_state)
+					index[to_state] = len(new_states)
+				d.transitions[i + 1][j] = index[to_state]
+
+			if end in new_states[i]:
+				d.acceptStates.append(i + 1)
+			i += 1
+
+		d.numStates = len(new_states)
+		d.startState = 1
+
+		return d
 
 if __name__ == "__main__":
 	# for debuggin
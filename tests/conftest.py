@@ -0,0 +1,31 @@
+""" Shared fixtures for the tests: token specs, grammars and sources written
+with the generators of bench.py into each test's temporary directory.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench
+
+@pytest.fixture
+def statement_files(tmp_path):
+    """ Returns (token file, grammar file, write_source) for the statement
+    grammar of bench.py; write_source(name, num_statements, seed) writes a
+    source file and returns its name.
+    """
+
+    token_file = str(tmp_path / "tokens.txt")
+    grammar_file = str(tmp_path / "grammar.txt")
+    bench.write_token_spec(token_file)
+    bench.write_statement_grammar(grammar_file)
+
+    def write_source(name, num_statements, seed=0):
+        source_file = str(tmp_path / name)
+        bench.write_source(source_file, num_statements, seed)
+        return source_file
+
+    return token_file, grammar_file, write_source
@@ -0,0 +1,32 @@
+""" Tests of parsing many files in worker processes. """
+
+from batch import parse_files
+from parse import Grammar
+
+def test_parse_files_reports_errors_per_file(statement_files, tmp_path):
+    token_file, grammar_file, write_source = statement_files
+    grammar = Grammar(token_file, grammar_file)
+    sources = [write_source(f"src{i}.txt", 10, seed=i) for i in range(4)]
+    with open(sources[1], "a") as f:
+        f.write("x = ;\n")
+    # not valid UTF-8, nor probably in the locale's encoding
+    undecodable = str(tmp_path / "undecodable.txt")
+    with open(undecodable, "wb") as f:
+        f.write(b"x = 1;\n\xff\xfe\x80 = 2;\n")
+    sources.insert(2, undecodable)
+    sources.append(str(tmp_path / "missing.txt"))
+
+    def outcome(source_file):
+        try:
+            return grammar.parse(source_file)
+        except Exception as e:
+            return type(e).__name__
+
+    expected = [outcome(source_file) for source_file in sources]
+    assert expected[1] == "SourceFileSyntaxError"
+    assert expected[2] in ("UnicodeDecodeError", "InvalidToken")
+    assert expected[-1] == "FileNotFoundError"
+
+    results = list(parse_files(grammar, sources, max_workers=2, ordered=True))
+    assert [source_file for source_file, _, _ in results] == sources
+    assert [tree if error == None else type(error).__name__ for _, tree, error in results] == expected
@@ -0,0 +1,147 @@
+""" Tests of the compiled scanner and parse table caches. """
+
+import copy
+import json
+import os
+
+import pytest
+
+from dfa import DFA, DFA_MAGIC, FileFormatError
+from lexer import CACHE_MAGIC, Lex
+from parse import Grammar
+
+def scanner_cache(cache_dir):
+    (name,) = [name for name in os.listdir(cache_dir) if name.startswith("lex-")]
+    return os.path.join(cache_dir, name)
+
+def lex_tokens(lex, text):
+    return list(lex.for_source(text=text).tokens())
+
+def test_scanner_cache_round_trip(statement_files, tmp_path):
+    token_file, _, _ = statement_files
+    cache_dir = str(tmp_path / "cache")
+    built = Lex(token_file, None, cache_dir=cache_dir)
+    loaded = Lex(token_file, None, cache_dir=cache_dir)
+    assert loaded.load_scanner(scanner_cache(cache_dir)) != None
+    text = "abc = (x1 + 42) * y;"
+    assert lex_tokens(loaded, text) == lex_tokens(built, text) == lex_tokens(Lex(token_file, None), text)
+
+def corruptions(data):
+    """ Generates damaged copies of a scanner cache file's contents. """
+
+    for length in (len(data) - 1, len(data) // 2, len(CACHE_MAGIC) + 32 + len(DFA_MAGIC) + 3, 80, 10, 0):
+        yield data[:length]
+
+    # each count of the DFA header set far too large
+    header = len(CACHE_MAGIC) + 32 + len(DFA_MAGIC)
+    for field in range(7):
+        start = header + 4 * field
+        yield data[:start] + (10 ** 6).to_bytes(4, "little") + data[start + 4:]
+
+    yield data[:-8] + b"\xff" * 8
+
+@pytest.mark.parametrize("damage", range(14))
+def test_corrupt_scanner_cache_is_rebuilt(statement_files, tmp_path, damage):
+    token_file, _, _ = statement_files
+    cache_dir = str(tmp_path / "cache")
+    Lex(token_file, None, cache_dir=cache_dir)
+    cache_file = scanner_cache(cache_dir)
+    with open(cache_file, "rb") as f:
+        data = f.read()
+
+    with open(cache_file, "wb") as f:
+        f.write(list(corruptions(data))[damage])
+    lex = Lex(token_file, None, cache_dir=cache_dir)
+    text = "abc = (x1 + 42) * y;"
+    assert lex_tokens(lex, text) == lex_tokens(Lex(token_file, None), text)
+
+    # and the cache was written again
+    assert Lex(token_file, None).load_scanner(cache_file) != None
+
+def test_dfa_loads_rejects_truncated_data(statement_files):
+    token_file, _, _ = statement_files
+    data = Lex(token_file, None).scanner.dumps()
+    assert DFA.loads(data).acceptTokens != {}
+    for length in range(0, len(data), 7):
+        with pytest.raises(FileFormatError):
+            DFA.loads(data[:length])
+
+def test_unwritable_scanner_cache_is_not_an_error(statement_files, tmp_path):
+    token_file, _, _ = statement_files
+    # a cache_dir that is a file cannot be created or written to
+    cache_dir = str(tmp_path / "not_a_dir")
+    open(cache_dir, "w").close()
+    lex = Lex(token_file, None, cache_dir=cache_dir)
+    assert lex_tokens(lex, "x = 1;") == lex_tokens(Lex(token_file, None), "x = 1;")
+
+def grammar_cache(cache_dir, method="slr"):
+    (name,) = [name for name in os.listdir(cache_dir) if name.startswith("parse-") and name.endswith(f"-{method}.json")]
+    return os.path.join(cache_dir, name)
+
+def test_parse_table_cache_round_trip(statement_files, tmp_path):
+    token_file, grammar_file, write_source = statement_files
+    source_file = write_source("src.txt", 30)
+    cache_dir = str(tmp_path / "cache")
+    expected = Grammar(token_file, grammar_file).parse(source_file)
+    for method in ("slr", "lalr"):
+        built = Grammar(token_file, grammar_file, cache_dir, method)
+        loaded = Grammar(token_file, grammar_file, cache_dir, method)
+        assert loaded.load_tables(grammar_cache(cache_dir, method))
+        assert built.parse(source_file) == loaded.parse(source_file) == expected
+        assert list(loaded.action_value) == list(built.action_value)
+
+def damaged_tables(tables):
+    """ Generates copies of the contents of a parse table cache file that
+    are valid JSON but not valid tables.
+    """
+
+    for key in ("terminals", "nonterminals", "rules", "first", "follow", "states"):
+        damaged = copy.deepcopy(tables)
+        del damaged[key]
+        yield damaged
+        damaged = copy.deepcopy(tables)
+        damaged[key] = 7
+        yield damaged
+
+    def edit(change):
+        damaged = copy.deepcopy(tables)
+        change(damaged)
+        return damaged
+
+    yield edit(lambda t: t["rules"][1].pop())
+    yield edit(lambda t: t["rules"][1].__setitem__(2, "NOT_A_SYMBOL"))
+    yield edit(lambda t: t["states"][0].pop("goto"))
+    yield edit(lambda t: t["states"][0]["kernel"].append([10 ** 6, 0]))
+    yield edit(lambda t: t["states"][0]["kernel"].append([1, 99]))
+    yield edit(lambda t: t["states"][0]["kernel"].append("x"))
+    yield edit(lambda t: t["states"][1]["action"].__setitem__(next(iter(t["states"][1]["action"])), ["shift", 10 ** 6]))
+    yield edit(lambda t: t["states"][1]["action"].__setitem__(next(iter(t["states"][1]["action"])), []))
+    yield edit(lambda t: t["states"][0]["goto"].__setitem__(next(iter(t["states"][0]["goto"])), -1))
+    yield edit(lambda t: t["states"].clear())
+    yield []
+
+@pytest.mark.parametrize("damage", range(23))
+def test_damaged_parse_table_cache_is_rebuilt(statement_files, tmp_path, damage):
+    token_file, grammar_file, write_source = statement_files
+    source_file = write_source("src.txt", 30)
+    cache_dir = str(tmp_path / "cache")
+    Grammar(token_file, grammar_file, cache_dir)
+    cache_file = grammar_cache(cache_dir)
+    with open(cache_file) as f:
+        tables = json.load(f)
+
+    with open(cache_file, "w") as f:
+        json.dump(list(damaged_tables(tables))[damage], f)
+    grammar = Grammar(token_file, grammar_file, cache_dir)
+    assert grammar.parse(source_file) == Grammar(token_file, grammar_file).parse(source_file)
+
+    # and the cache was written again
+    assert Grammar(token_file, grammar_file).load_tables(cache_file)
+
+def test_unwritable_parse_table_cache_is_not_an_error(statement_files, tmp_path):
+    token_file, grammar_file, write_source = statement_files
+    source_file = write_source("src.txt", 5)
+    cache_dir = str(tmp_path / "not_a_dir")
+    open(cache_dir, "w").close()
+    grammar = Grammar(token_file, grammar_file, cache_dir)
+    assert grammar.parse(source_file) == Grammar(token_file, grammar_file).parse(source_file)
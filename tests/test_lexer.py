@@ -0,0 +1,114 @@
+""" Tests of the lexer: token streams and their sources. """
+
+import pytest
+
+from lexer import CHUNK_SIZE, Lex
+from parse import Grammar, Parser, SourceFileSyntaxError
+
+def test_source_file_closed_after_parse(statement_files):
+    token_file, grammar_file, write_source = statement_files
+    source_file = write_source("src.txt", 10)
+    grammar = Grammar(token_file, grammar_file)
+
+    parser = Parser.from_grammar(grammar, source_file)
+    parser.parse()
+    assert parser.lexer.source_f.closed
+
+    with open(source_file, "a") as f:
+        f.write("x = = ;\n")
+    parser = Parser.from_grammar(grammar, source_file)
+    with pytest.raises(SourceFileSyntaxError):
+        parser.parse()
+    assert parser.lexer.source_f.closed
+
+def test_source_file_closed_by_lexer(statement_files):
+    token_file, _, write_source = statement_files
+    source_file = write_source("src.txt", 10)
+    lex = Lex(token_file, source_file)
+    assert len(list(lex.tokens())) > 0
+    assert lex.source_f.closed
+
+    # a stream that is not read to the end, and a lexer not read at all
+    stream = Lex(token_file, source_file).tokens()
+    next(stream)
+    stream.close()
+    with Lex(token_file, None).for_source(source_file) as lex:
+        pass
+    assert lex.source_f.closed
+
+def stream_tokens(lex, text, chunk_size):
+    lex = lex.for_source(text=text)
+    lex.chunk_size = chunk_size
+    return list(lex.tokens())
+
+def buffer_tokens(lex, text):
+    buffer = text.encode("latin-1")
+    return [span if span == "INVALID" else (span[0], lex.text(buffer, span[1], span[2]))
+            for span in lex.for_buffer(buffer).spans()]
+
+@pytest.mark.parametrize("combined", [True, False])
+def test_tokens_independent_of_chunk_size(statement_files, combined):
+    token_file, _, write_source = statement_files
+    with open(write_source("src.txt", 40)) as f:
+        text = f.read()
+    # a token longer than the chunks, and statements without whitespace
+    text += "x = " + "ab1" * 100 + ";\n" + "".join(text.split()[:200])
+    lex = Lex(token_file, None, combined=combined)
+
+    expected = buffer_tokens(lex, text)
+    assert "INVALID" not in expected
+    for chunk_size in (1, 2, 3, 7, 64, CHUNK_SIZE):
+        assert stream_tokens(lex, text, chunk_size) == expected, chunk_size
+
+    # with characters outside the alphabet
+    text = text.replace("a", "e")
+    expected = buffer_tokens(lex, text)
+    assert "INVALID" in expected
+    for chunk_size in (1, 2, 3, 7, 64, CHUNK_SIZE):
+        assert stream_tokens(lex, text, chunk_size) == expected, chunk_size
+
+def test_tokens_streamed_without_whitespace(statement_files):
+    token_file, _, write_source = statement_files
+    with open(write_source("src.txt", 2000)) as f:
+        text = "".join(f.read().split())
+    lex = Lex(token_file, None).for_source(text=text)
+    lex.chunk_size = 64
+
+    # each token is yielded before much more than a chunk past it is read
+    consumed = 0
+    longest = 0
+    for token in lex.tokens():
+        consumed += len(token[1])
+        longest = max(longest, len(token[1]))
+        assert lex.source_f.tell() - consumed <= lex.chunk_size + longest
+    assert consumed == len(text)
+
+@pytest.mark.parametrize("combined", [True, False])
+def test_source_spans_match_buffer_spans(statement_files, combined):
+    token_file, _, write_source = statement_files
+    source_file = write_source("src.txt", 200)
+    with open(source_file) as f:
+        text = f.read()
+    lex = Lex(token_file, None, combined=combined)
+
+    for source in (text, text.replace("b", "e")):
+        buffer = source.encode("latin-1")
+        expected = list(lex.for_buffer(buffer).spans())
+        file_lex = lex.for_source(text=source)
+        file_lex.chunk_size = 16
+        spans = []
+        for span in file_lex.spans():
+            spans.append(span)
+            if span != "INVALID":
+                assert file_lex.token_text(span[1], span[2]) == source[span[1]:span[2]]
+        assert spans == expected
+
+def test_buffer_parse_matches_file_parse(statement_files):
+    token_file, grammar_file, write_source = statement_files
+    grammar = Grammar(token_file, grammar_file)
+    for i in range(5):
+        source_file = write_source(f"src{i}.txt", 30, seed=i)
+        with open(source_file, "rb") as f:
+            buffer = f.read()
+        assert grammar.parse(buffer=buffer) == grammar.parse(source_file)
+        assert grammar.parse(buffer=buffer, compact=True) == grammar.parse(source_file, compact=True)
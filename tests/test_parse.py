@@ -0,0 +1,288 @@
+""" Tests of the parse tables and the parser against a reference LR driver. """
+
+import random
+import sys
+
+import pytest
+
+import bench
+from lexer import InvalidToken
+from parse import Grammar, NonLRGrammarError, Parser, SourceFileSyntaxError
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+def reference_parse(grammar, source_file, compact=False):
+    """ Parses source_file with the action and goto dicts of grammar's
+    states, one token and one reduction at a time, as the parse tree in
+    preorder.
+    """
+
+    with grammar.lexer.for_source(source_file) as lex:
+        tokens = lex.tokens()
+        # stack of (state, (item, children))
+        stack = [(0, None)]
+        token = next(tokens, None)
+        while True:
+            if token == "INVALID":
+                raise InvalidToken
+            terminal = grammar.end_of_input if token == None else token[0]
+            state = grammar.states[stack[-1][0]]
+            action = state.action.get(terminal)
+            if action == None:
+                raise SourceFileSyntaxError
+            elif action[0] == "shift":
+                stack.append((action[1], (token[1], [])))
+                token = next(tokens, None)
+            elif action[0] == "reduce":
+                rule = grammar.rules[action[1]]
+                if rule.rhs[0] == grammar.epsilon:
+                    children = [("eps", [])]
+                else:
+                    children = [node for _, node in stack[len(stack) - len(rule.rhs):]]
+                    del stack[len(stack) - len(rule.rhs):]
+                if compact and len(rule.rhs) == 1 and rule.rhs[0] in grammar.nonterminals:
+                    node = children[0]
+                else:
+                    node = (rule.lhs, children)
+                stack.append((grammar.states[stack[-1][0]].goto[rule.lhs], node))
+            else:
+                break
+
+    preorder = []
+    nodes = [stack[-1][1]]
+    while len(nodes) > 0:
+        item, children = nodes.pop()
+        preorder.append(item)
+        nodes.extend(reversed(children))
+    return preorder
+
+def outcome(parse):
+    try:
+        return parse()
+    except (InvalidToken, SourceFileSyntaxError) as e:
+        return type(e).__name__
+
+def test_lalr_grammar_that_is_not_slr(tmp_path):
+    token_file = write(tmp_path / "tokens.txt",
+                       'alphabet "xyz=*"\nID "(x|y|z)(x|y|z)*"\nASSIGN "="\nSTAR "\\*"\n')
+    grammar_file = write(tmp_path / "grammar.txt",
+                         "ASSIGN STAR ID\n%%\nS : L ASSIGN R\nS : R\nL : STAR R\nL : ID\nR : L\n%%\n")
+    source_file = write(tmp_path / "src.txt", "*x = **y\n")
+
+    with pytest.raises(NonLRGrammarError):
+        Grammar(token_file, grammar_file, method="slr")
+
+    grammar = Grammar(token_file, grammar_file, method="lalr")
+    assert grammar.parse(source_file) == ["S", "L", "*", "R", "L", "x", "=",
+                                          "R", "L", "*", "R", "L", "*", "R", "L", "y"]
+    assert grammar.parse(source_file) == reference_parse(grammar, source_file)
+    assert outcome(lambda: grammar.parse(text="x = = y")) == "SourceFileSyntaxError"
+
+def damaged_source(path, source_file, rng):
+    """ Writes source_file to path with one token dropped or repeated. """
+
+    with open(source_file) as f:
+        words = f.read().split(" ")
+    i = rng.randrange(len(words))
+    if rng.random() < 0.5:
+        del words[i]
+    else:
+        words.insert(i, words[i])
+    return write(path, " ".join(words))
+
+@pytest.mark.parametrize("method", ["slr", "lalr"])
+def test_parse_options_match_reference(tmp_path, statement_files, method):
+    token_file, grammar_file, write_source = statement_files
+    layered_tokens = str(tmp_path / "layered_tokens.txt")
+    layered_grammar = str(tmp_path / "layered_grammar.txt")
+    bench.write_layered_token_spec(layered_tokens, 6)
+    bench.write_layered_grammar(layered_grammar, 6)
+    eps_tokens = write(tmp_path / "eps_tokens.txt",
+                       'alphabet "abcxyz+;"\nID "(a|b|c|x|y|z)(a|b|c|x|y|z)*"\nPLUS "+"\nSEMI ";"\n')
+    eps_grammar = write(tmp_path / "eps_grammar.txt",
+                        "ID PLUS SEMI\n%%\nS : ID L SEMI\nL : PLUS ID L\nL : eps\n%%\n")
+
+    rng = random.Random(1)
+    sources = {grammar_file: [], layered_grammar: [], eps_grammar: []}
+    for i in range(20):
+        sources[grammar_file].append(write_source(f"src{i}.txt", rng.randint(1, 8), seed=i))
+        sources[grammar_file].append(damaged_source(tmp_path / f"bad{i}.txt", sources[grammar_file][-1], rng))
+        layered = str(tmp_path / f"layered{i}.txt")
+        bench.write_layered_source(layered, 6, rng.randint(1, 30), seed=i)
+        sources[layered_grammar].extend([layered, damaged_source(tmp_path / f"badlayered{i}.txt", layered, rng)])
+        eps = write(tmp_path / f"eps{i}.txt", "a" + " + b" * rng.randint(0, 5) + " ;")
+        sources[eps_grammar].extend([eps, damaged_source(tmp_path / f"badeps{i}.txt", eps, rng)])
+
+    for tokens, grammar_name in ((token_file, grammar_file), (layered_tokens, layered_grammar),
+                                 (eps_tokens, eps_grammar)):
+        reference = Grammar(tokens, grammar_name, method=method)
+        expected = {(source, compact): outcome(lambda: reference_parse(reference, source, compact))
+                    for source in sources[grammar_name] for compact in (False, True)}
+        assert "SourceFileSyntaxError" in expected.values()
+
+        for compress in (True, False):
+            for bypass_units in (True, False):
+                grammar = Grammar(tokens, grammar_name, method=method, compress=compress,
+                                  bypass_units=bypass_units)
+                for (source, compact), tree in expected.items():
+                    assert outcome(lambda: grammar.parse(source, compact=compact)) == tree, \
+                        (source, compact, compress, bypass_units)
+
+def action(grammar, state, code):
+    i = grammar.action_base[state] + code
+    return grammar.action_value[i] if grammar.action_check[i] == state else grammar.action_default[state]
+
+def goto(grammar, code, state):
+    i = grammar.goto_base[code] + state
+    return grammar.goto_value[i] if grammar.goto_check[i] == code else grammar.goto_default[code]
+
+# Lists of statements with epsilon rules, and a terminal (Y) no rule uses
+EPS_TOKENS = 'alphabet "xy=;"\nID "x"\nY "y"\nASSIGN "="\nSEMI ";"\n'
+EPS_GRAMMAR = "ID Y ASSIGN SEMI\n%%\nP : L\nL : L A\nL : eps\nA : ID V SEMI\nV : ASSIGN ID\nV : eps\n%%\n"
+EPS_SOURCES = ["", "x;", "x = x; x;", "x y", "y", "x; y", "x = ;", "x = x = x;", "x; x", ";", "x; x y;"]
+
+@pytest.mark.parametrize("levels", [1, 6, 40, None])
+def test_packed_tables_match_dense_tables(tmp_path, levels):
+    """ levels None is the epsilon grammar EPS_GRAMMAR. """
+
+    token_file = str(tmp_path / "tokens.txt")
+    grammar_file = str(tmp_path / "grammar.txt")
+    if levels == None:
+        write(token_file, EPS_TOKENS)
+        write(grammar_file, EPS_GRAMMAR)
+        sources = [write(tmp_path / f"src{i}.txt", text) for i, text in enumerate(EPS_SOURCES)]
+    else:
+        bench.write_layered_token_spec(token_file, levels)
+        bench.write_layered_grammar(grammar_file, levels)
+        rng = random.Random(levels)
+        sources = []
+        for i in range(10):
+            sources.append(str(tmp_path / f"src{i}.txt"))
+            bench.write_layered_source(sources[-1], levels, rng.randint(1, 10), seed=i)
+            sources.append(damaged_source(tmp_path / f"bad{i}.txt", sources[-1], rng))
+
+    for method in ("slr", "lalr"):
+        packed = Grammar(token_file, grammar_file, method=method)
+        dense = Grammar(token_file, grammar_file, method=method, compress=False)
+        if levels != None:
+            assert packed.table_bytes()[1] < dense.table_bytes()[1]
+        assert len(dense.action_value) == len(dense.states) * (len(dense.terminal_codes) + 1)
+
+        for state_number, state in enumerate(dense.states):
+            for code in range(dense.invalid_code + 1):
+                expected = action(dense, state_number, code)
+                # a packed state may reduce by its default where the dense
+                # table has an error; every other entry is the same
+                if expected == 0:
+                    assert action(packed, state_number, code) in (0, packed.action_default[state_number])
+                else:
+                    assert action(packed, state_number, code) == expected
+
+            # and that default is one of the state's own reductions, by a
+            # rule with a non-empty rhs
+            reductions = {-entry[1] - 1 for entry in state.action.values()
+                          if entry[0] == "reduce" and dense.rules[entry[1]].rhs[0] != dense.epsilon}
+            assert packed.action_default[state_number] in reductions | {0}
+            assert dense.action_default[state_number] == 0
+
+            for terminal, entry in state.action.items():
+                code = dense.terminal_codes[terminal]
+                if entry[0] == "shift":
+                    assert action(dense, state_number, code) == entry[1] + 1
+                elif entry[0] == "reduce":
+                    assert action(dense, state_number, code) == -entry[1] - 1
+                else:
+                    assert action(dense, state_number, code) == -1
+
+            for nonterminal, target in state.goto.items():
+                code = dense.nonterminal_codes[nonterminal]
+                assert goto(dense, code, state_number) == goto(packed, code, state_number) == target
+
+        # the same parses, and the same errors, where the packed tables reduce before an error
+        outcomes = [outcome(lambda: reference_parse(dense, source)) for source in sources]
+        assert "SourceFileSyntaxError" in outcomes
+        for grammar in (packed, dense):
+            assert [outcome(lambda: grammar.parse(source)) for source in sources] == outcomes
+
+def test_deep_tree_preorder(tmp_path):
+    token_file = write(tmp_path / "tokens.txt", 'alphabet "x()"\nID "x"\nLPAREN "\\("\nRPAREN "\\)"\n')
+    grammar_file = write(tmp_path / "grammar.txt", "ID LPAREN RPAREN\n%%\nE : LPAREN E RPAREN\nE : ID\n%%\n")
+    # nested far deeper than a recursive traversal could go
+    depth = 5 * sys.getrecursionlimit()
+    source_file = write(tmp_path / "src.txt", "(" * depth + "x" + ")" * depth)
+    expected = ["E", "("] * depth + ["E", "x"] + [")"] * depth
+
+    grammar = Grammar(token_file, grammar_file)
+    assert grammar.parse(source_file) == expected
+    assert list(Parser.from_grammar(grammar, source_file).parse_tree().preorder()) == expected
+    tree = Parser.from_grammar(grammar, source_file).parse_array()
+    assert list(tree.preorder()) == expected
+    assert list(tree.preorder(tree.first_child(tree.root))) == ["("]
+
+def test_array_tree_spans_and_symbols(tmp_path, statement_files):
+    token_file = write(tmp_path / "lalr_tokens.txt",
+                       'alphabet "xyzLR=*"\nID "(x|y|z|L|R)(x|y|z|L|R)*"\nASSIGN "="\nSTAR "\\*"\n')
+    grammar_file = write(tmp_path / "lalr_grammar.txt",
+                         "ASSIGN STAR ID\n%%\nS : L ASSIGN R\nS : R\nL : STAR R\nL : ID\nR : L\n%%\n")
+    # tokens whose text is the name of a nonterminal
+    text = "*L =\n **  R\n"
+    source_file = write(tmp_path / "lalr_src.txt", text)
+    grammar = Grammar(token_file, grammar_file, method="lalr")
+
+    for kwargs in ({"source_filename": source_file}, {"text": text}, {"buffer": text.encode("latin-1")}):
+        tree = Parser.from_grammar(grammar, **kwargs).parse_array()
+        assert list(tree.preorder()) == grammar.parse(source_file)
+        leaves = [node for node in range(len(tree)) if tree.first_child(node) == -1]
+        assert [tree.symbol(node) for node in leaves] == ["STAR", "ID", "ASSIGN", "STAR", "STAR", "ID"]
+        assert [(tree.starts[node], tree.ends[node]) for node in leaves] == \
+            [(0, 1), (1, 2), (3, 4), (6, 7), (7, 8), (10, 11)]
+        assert [tree.item(node) for node in leaves] == ["*", "L", "=", "*", "*", "R"]
+        assert tree.symbol(tree.root) == "S"
+        assert tree.item(tree.first_child(tree.root)) == "L"
+        assert tree.symbol(leaves[1]) != tree.symbol(tree.first_child(tree.root))
+
+    # token events carry the same spans, and the text only if asked for
+    events = [event for event in Parser.from_grammar(grammar, source_file).events() if event[0] == "token"]
+    assert [(value, start, end) for _, value, _, start, end in events] == \
+        [(text[start:end], start, end) for _, _, _, start, end in events]
+    events = [event for event in Parser.from_grammar(grammar, source_file).events(text=False)
+              if event[0] == "token"]
+    assert {event[1] for event in events} == {None}
+
+    # files read in several chunks, and epsilon leaves
+    token_file, grammar_file, write_source = statement_files
+    grammar = Grammar(token_file, grammar_file)
+    source_file = write_source("long.txt", 300)
+    parser = Parser.from_grammar(grammar, source_file)
+    parser.lexer.chunk_size = 64
+    assert list(parser.parse_array().preorder()) == grammar.parse(source_file)
+    eps_tokens = write(tmp_path / "eps_tokens.txt", 'alphabet "ab+;"\nID "(a|b)(a|b)*"\nPLUS "+"\nSEMI ";"\n')
+    eps_grammar = write(tmp_path / "eps_grammar.txt",
+                        "ID PLUS SEMI\n%%\nS : ID L SEMI\nL : PLUS ID L\nL : eps\n%%\n")
+    grammar = Grammar(eps_tokens, eps_grammar)
+    tree = Parser.from_grammar(grammar, text="a + b ;").parse_array()
+    assert list(tree.preorder()) == ["S", "a", "L", "+", "b", "L", "eps", ";"]
+
+def test_epsilon_reductions_are_checked_for_conflicts(tmp_path):
+    token_file = write(tmp_path / "tokens.txt", 'alphabet "xy"\nID "x"\nY "y"\n')
+    # ambiguous: A : eps makes L : L A derive L from itself
+    grammar_file = write(tmp_path / "grammar.txt", "ID Y\n%%\nP : L\nL : L A\nL : eps\nA : ID\nA : eps\n%%\n")
+    for method in ("slr", "lalr"):
+        for compress in (True, False):
+            with pytest.raises(NonLRGrammarError):
+                Grammar(token_file, grammar_file, method=method, compress=compress)
+
+    # without A : eps, a token with no action is an error, not a loop of reductions
+    grammar_file = write(tmp_path / "grammar.txt", "ID Y\n%%\nP : L\nL : L A\nL : eps\nA : ID\n%%\n")
+    for method in ("slr", "lalr"):
+        for compress in (True, False):
+            for bypass_units in (True, False):
+                grammar = Grammar(token_file, grammar_file, method=method, compress=compress,
+                                  bypass_units=bypass_units)
+                assert outcome(lambda: grammar.parse(text="x y")) == "SourceFileSyntaxError"
+                assert outcome(lambda: grammar.parse(text="y")) == "SourceFileSyntaxError"
+                assert grammar.parse(text="x x") == ["P", "L", "L", "L", "eps", "A", "x", "A", "x"]
+                assert grammar.parse(text="") == ["P", "L", "eps"]
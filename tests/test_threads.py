@@ -0,0 +1,64 @@
+""" Tests of threads sharing one Grammar. """
+
+import pickle
+import sys
+import threading
+
+from parse import Grammar, Parser, SourceFileSyntaxError
+
+def parse_all_ways(grammar, source_file):
+    """ The results of parsing source_file with grammar in each way a
+    Parser can, and of the grammar's goto on every state.
+    """
+
+    with open(source_file, "rb") as f:
+        buffer = f.read()
+    results = []
+    for parse in (lambda: grammar.parse(source_file),
+                  lambda: grammar.parse(buffer=buffer, compact=True),
+                  lambda: list(Parser.from_grammar(grammar, text=buffer.decode()).parse_array().preorder()),
+                  lambda: list(Parser.from_grammar(grammar, source_file).parse_tree().preorder())):
+        try:
+            results.append(parse())
+        except SourceFileSyntaxError:
+            results.append("SourceFileSyntaxError")
+    results.append([grammar.kernel_key(grammar.goto(state, symbol)) for state in grammar.states
+                    for symbol in sorted(state.goto)])
+    return results
+
+def test_threads_share_grammar(statement_files):
+    token_file, grammar_file, write_source = statement_files
+    sources = [write_source(f"src{i}.txt", 20 + i, seed=i) for i in range(16)]
+    with open(sources[5], "a") as f:
+        f.write("x = ;\n")
+    expected = [parse_all_ways(Grammar(token_file, grammar_file), source_file) for source_file in sources]
+    assert expected[5][0] == "SourceFileSyntaxError"
+
+    # a grammar no thread has used yet, and threads switching as often as possible
+    grammar = Grammar(token_file, grammar_file)
+    tables = pickle.dumps(grammar)
+    results = [None] * len(sources)
+    errors = []
+
+    def run(i):
+        try:
+            results[i] = parse_all_ways(grammar, sources[i])
+        except Exception as e:
+            errors.append(e)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(sources))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+    for i, source_file in enumerate(sources):
+        assert results[i] == expected[i], source_file
+    # nothing was filled in lazily
+    assert pickle.dumps(grammar) == tables